@@ -16,12 +16,40 @@ warnings.filterwarnings("ignore", category=UserWarning)
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+
+    from .db_pool import configure_pool
+    configure_pool(app)
+
     # Initialize extensions 
     db.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)  # Initialize migrate with app and db
 
+    from .metrics import init_metrics
+    init_metrics(app)
+
+    from .query_stats import init_query_stats
+    init_query_stats(app)
+
+    from .cache import init_cache
+    init_cache(app)
+
+    from .currency import init_currency
+    init_currency(app)
+
+    from .passwords import init_passwords
+    init_passwords(app)
+
+    from .throttle import init_throttle
+    init_throttle(app)
+
+    from .user_cache import init_user_cache
+    init_user_cache(app)
+
+    from .reference_data import init_reference_data
+    init_reference_data(app)
+
     # Import and register blueprints (routes) here to avoid circular import
     from .dashboard import dashboard_routes
     app.register_blueprint(dashboard_routes, url_prefix='/')
@@ -44,6 +72,25 @@ def create_app():
     from .budget import budgets_bp
     app.register_blueprint(budgets_bp)
 
+    from .analysis import analysis_bp
+    app.register_blueprint(analysis_bp, url_prefix='/analysis')
+
+    from .jobs import jobs_bp
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+
+    from .monitoring import monitoring_bp
+    app.register_blueprint(monitoring_bp, url_prefix='/monitoring')
+
+    # CLI commands
+    from .importer import import_records_command
+    app.cli.add_command(import_records_command)
+
+    from .jobs import run_worker_command
+    app.cli.add_command(run_worker_command)
+
+    from .commands import register_commands
+    register_commands(app)
+
     app.config['DEBUG'] = True  # Enable debug mode
 
     return app
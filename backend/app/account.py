@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from app.models import db, Account
+from app.models import db, Account, AccountTotals, Record, User
+from app.reference_data import get_reference_data
+from app.utils import fetch_currencies
 
 account_bp = Blueprint('account', __name__, url_prefix='/account')
 
@@ -10,8 +12,12 @@ def list_accounts():
     """
     Display all accounts for the logged-in user.
     """
-    user_accounts = Account.query.filter_by(user_id=current_user.id).all()
-    return render_template('list_accounts.html', accounts=user_accounts)
+    return render_template(
+        'list_accounts.html',
+        accounts=get_reference_data(current_user.id).accounts,
+        currencies=fetch_currencies(),
+        default_currency=current_user.currency
+    )
 
 @account_bp.route('/add', methods=['POST'])
 @login_required
@@ -21,6 +27,7 @@ def add_account():
     """
     account_type = request.form.get('account_type')
     initial_balance = request.form.get('balance', 0.0, type=float)
+    currency = request.form.get('currency') or current_user.currency
 
     if not account_type:
         flash("Account type is required!", "warning")
@@ -36,9 +43,11 @@ def add_account():
     new_account = Account(
         user_id=current_user.id,
         account_type=account_type,
-        balance=initial_balance
+        balance=initial_balance,
+        currency=currency
     )
     db.session.add(new_account)
+    User.bump_data_version(current_user.id)
     db.session.commit()
 
     flash(f"Account '{account_type}' added successfully!", "success")
@@ -58,19 +67,27 @@ def edit_account(account_id):
     if request.method == 'POST':
         account_type = request.form.get('account_type')
         balance = request.form.get('balance', type=float)
+        currency = request.form.get('currency') or account.currency
 
         if not account_type:
             flash("Account type is required!", "warning")
             return redirect(url_for('account.edit_account', account_id=account_id))
 
+        # Records carry their account's currency, so it can only change while the account is empty
+        if currency != account.currency and Record.query.filter_by(account_id=account.id).first():
+            flash("The currency of an account with records can't be changed.", "warning")
+            return redirect(url_for('account.edit_account', account_id=account_id))
+
         account.account_type = account_type
         account.balance = balance
+        account.currency = currency
+        User.bump_data_version(current_user.id)
         db.session.commit()
 
         flash(f"Account '{account_type}' updated successfully!", "success")
         return redirect(url_for('account.list_accounts'))
 
-    return render_template('edit_account.html', account=account)
+    return render_template('edit_account.html', account=account, currencies=fetch_currencies())
 
 
 @account_bp.route('/delete/<int:account_id>', methods=['POST'])
@@ -84,7 +101,10 @@ def delete_account(account_id):
         flash("Account not found or unauthorized access.", "danger")
         return redirect(url_for('account.list_accounts'))
 
+    # The totals row only exists while the account has (or had) records
+    AccountTotals.query.filter_by(account_id=account.id).delete()
     db.session.delete(account)
+    User.bump_data_version(current_user.id)
     db.session.commit()
 
     flash(f"Account '{account.account_type}' deleted successfully!", "success")
@@ -0,0 +1,108 @@
+"""Income/expense series for the charts, read from the daily rollups.
+
+Income and expense are summed together in one query, bucketed by a
+dialect-specific date expression (MySQL, PostgreSQL or SQLite).
+"""
+from datetime import date, datetime
+
+from sqlalchemy import func
+
+from .fx import conversion_factor, current_rates
+from .models import DailyRollup, db
+
+GRANULARITIES = ('daily', 'weekly', 'monthly', 'quarterly')
+
+
+def bucket_expression(column, granularity, dialect_name):
+    """Return a SQL expression giving the first day of the bucket that `column` falls in."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'.")
+
+    if granularity == 'daily':
+        return column
+
+    if dialect_name == 'postgresql':
+        unit = {'weekly': 'week', 'monthly': 'month', 'quarterly': 'quarter'}[granularity]
+        return func.date(func.date_trunc(unit, column))
+
+    if dialect_name in ('mysql', 'mariadb'):
+        if granularity == 'weekly':
+            # WEEKDAY() is 0 for Monday, matching ISO weeks and Postgres' date_trunc('week')
+            return func.subdate(column, func.weekday(column))
+        if granularity == 'monthly':
+            return func.date_format(column, '%Y-%m-01')
+        return func.str_to_date(
+            func.concat(func.year(column), '-', (func.quarter(column) - 1) * 3 + 1, '-01'), '%Y-%c-%d'
+        )
+
+    if dialect_name == 'sqlite':
+        if granularity == 'weekly':
+            # strftime('%w') is 0 for Sunday; shift so weeks start on Monday
+            return func.date(column, func.printf('-%d days', (func.strftime('%w', column) + 6) % 7))
+        if granularity == 'monthly':
+            return func.strftime('%Y-%m-01', column)
+        return func.date(column, 'start of month',
+                         func.printf('-%d months', (func.strftime('%m', column) - 1) % 3))
+
+    raise ValueError(f"Aggregation is not supported on '{dialect_name}'.")
+
+
+def _bucket_key(value):
+    """Normalise whatever the driver returned for a bucket into 'YYYY-MM-DD'."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+def aggregate_rollups(user_id, granularity, start_date=None, end_date=None, currency=None):
+    """
+    Sum a user's income and expense per date bucket from the daily rollup rows.
+    Weekly, monthly and quarterly buckets are derived from the rollup day.
+    Rollups are summed per currency in SQL and converted to `currency` in one pass.
+
+    Returns a list of dicts ordered by bucket:
+    {'bucket': 'YYYY-MM-DD', 'income': float, 'expense': float}
+    """
+    dialect_name = db.session.get_bind().dialect.name
+    bucket = bucket_expression(DailyRollup.day, granularity, dialect_name).label('bucket')
+
+    query = db.session.query(
+        bucket,
+        DailyRollup.currency,
+        func.coalesce(func.sum(DailyRollup.total_income), 0.0).label('income'),
+        func.coalesce(func.sum(DailyRollup.total_expense), 0.0).label('expense'),
+    ).filter(DailyRollup.user_id == user_id)
+    if start_date:
+        query = query.filter(DailyRollup.day >= start_date)
+    if end_date:
+        query = query.filter(DailyRollup.day <= end_date)
+
+    # Rows whose records were all deleted or moved stay behind with a zero count
+    rows = query.group_by(bucket, DailyRollup.currency) \
+        .having(func.sum(DailyRollup.record_count) > 0) \
+        .order_by(bucket).all()
+
+    needs_rates = currency and any(row.currency != currency for row in rows)
+    rates = current_rates()[1] if needs_rates else {}
+
+    # Fold the per-currency rows into one row per bucket
+    results = {}
+    for row in rows:
+        factor = conversion_factor(row.currency, currency, rates)
+        result = results.setdefault(_bucket_key(row.bucket),
+                                    dict(bucket=_bucket_key(row.bucket), income=0.0, expense=0.0))
+        result['income'] += float(row.income) * factor
+        result['expense'] += float(row.expense) * factor
+
+    return list(results.values())
+
+
+def income_expense_series(user_id, granularity, start_date=None, end_date=None, currency=None):
+    """Return ({bucket: income}, {bucket: expense}) for charting, read from the rollups."""
+    income, expense = {}, {}
+    for row in aggregate_rollups(user_id, granularity, start_date, end_date, currency=currency):
+        income[row['bucket']] = row['income']
+        expense[row['bucket']] = row['expense']
+    return income, expense
@@ -1,31 +1,47 @@
-from flask import request, jsonify
-from app import db
-from app.models import Analysis, Category
-from datetime import datetime  
-from sqlalchemy.orm import joinedload
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_required, current_user
-from .models import Account, Category, db, Record
+from .aggregation import GRANULARITIES
+from .jobs import enqueue
+from .models import Analysis
 
 
 analysis_bp = Blueprint('analysis', __name__, url_prefix='/analysis')
 
 @analysis_bp.route('/create-analysis', methods=['POST'])
+@login_required
 def create_analysis():
     """
     Create an analysis for the user and render the analysis results in a template.
     """
     try:
-        # Get the request data (e.g., user_id and date_range)
+        # Get the request data (granularity and an optional date window)
         data = request.form
-        user_id = data.get('user_id')
-        date_range = data.get('date_range')  # 'daily', 'weekly', 'monthly'
+        date_range = data.get('date_range')  # 'daily', 'weekly', 'monthly', 'quarterly'
+
+        if date_range not in GRANULARITIES:
+            flash("A valid date range is required.", 'warning')
+            return redirect(url_for('dashboard_routes.dashboard'))
+
+        try:
+            start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else None
+            end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+        except ValueError:
+            flash("Dates must be in YYYY-MM-DD format.", 'danger')
+            return redirect(url_for('dashboard_routes.dashboard'))
 
-        if not user_id or not date_range:
-            return render_template('error.html', message="User ID and date range are required.")
+        # Long windows can be handed to the background workers instead
+        if data.get('background'):
+            job = enqueue(current_user.id, 'analysis', {
+                'granularity': date_range,
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None,
+            })
+            return redirect(url_for('jobs.job_status', job_id=job.id))
 
-        # Create the analysis using the Analysis model
-        analysis = Analysis.create_analysis(user_id, date_range)
+        # Create the analysis using the Analysis model (analyses are always for the logged-in user)
+        analysis = Analysis.create_analysis(current_user.id, date_range, start_date, end_date)
 
         # Pass the analysis data to the template for rendering
         return render_template(
@@ -37,5 +53,5 @@ def create_analysis():
         )
     
     except Exception as e:
-        # Handle any errors and render an error page
-        return render_template('error.html', message=str(e))
\ No newline at end of file
+        flash(f"Error creating analysis: {str(e)}", 'danger')
+        return redirect(url_for('dashboard_routes.dashboard'))
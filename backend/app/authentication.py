@@ -1,11 +1,14 @@
 # app/routes.py
 
-from flask import Blueprint, jsonify , session,render_template , redirect , url_for , request , flash
+from flask import Blueprint, current_app, jsonify , session,render_template , redirect , url_for , request , flash
 from flask_login import login_user, logout_user
 from flask_login import login_required , current_user
 
 from app.utils import fetch_currencies
-from .models import Account, Category, Setting, db, User
+from .models import Setting, db, User
+from .passwords import HasherBusy, password_hasher
+from .provisioning import provision_user
+from .throttle import login_throttle
 
 #dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 
@@ -31,52 +34,16 @@ def register():
         currency = request.form['currency']
         # The request object in Flask provides access to all parts of the incoming HTTP request
 
-        if User.query.filter_by(username=username).first():
-            flash('Username already taken', 'danger')
+        # Creates the user with their default accounts and settings in one transaction
+        try:
+            provision_user(username, email, password, currency)
+        except ValueError as e:
+            flash(str(e), 'danger')
             return redirect(url_for('auth.register'))
-        
-        if User.query.filter_by(email=email).first():
-            flash('Email already registered', 'danger')
+        except HasherBusy as e:
+            flash(str(e), 'warning')
             return redirect(url_for('auth.register'))
 
-        # Create a new user and set the password hash
-        user = User(username=username, email=email)
-        user.set_password(password)
-        db.session.add(user)
-        db.session.commit()
-
-
-        # Create default accounts for the user
-        default_account_types = ['Cash', 'Card (Visa)', 'Savings']
-        for account_type in default_account_types:
-            default_account = Account(
-                user_id= user.id,
-                account_type=account_type,
-                balance=0.0
-            )
-            db.session.add(default_account)
-        db.session.commit()
-
-        # Create default settings for the user
-        default_setting = Setting(user_id=user.id, currency=currency)
-        db.session.add(default_setting)
-
-
-        
-        # Create default income and expense categories for the new user
-        income_categories = ['Awards', 'Coupons', 'Grants', 'Lottery', 'Refunds', 'Rental', 'Salary', 'Sale']
-        expense_categories = ['Beauty', 'Baby', 'Car Bills', 'Clothing', 'Education', 'Electronics', 'Health', 'Food', 'Entertainment', 'Home', 'Shopping', 'Social', 'Sport', 'Tax', 'Telephone', 'Transportation']
-
-        for name in income_categories:
-            income_category = Category(user_id=user.id, name=name, type='Income')
-            db.session.add(income_category)
-
-        for name in expense_categories:
-            expense_category = Category(user_id=user.id, name=name, type='Expense')
-            db.session.add(expense_category)
-
-        # Commit the transaction to save the user and categories
-        db.session.commit()
         flash('Account created successfully', 'success')
          # Fetch currencies dynamically using an API
        # currency = fetch_currencies()  # Fetch list of currencies
@@ -95,9 +62,27 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+
+        # Rejected attempts never reach the database or bcrypt
+        retry_after = login_throttle.check(username, request.remote_addr)
+        if retry_after:
+            flash(f'Too many login attempts, please try again in {retry_after} seconds.', 'warning')
+            return render_template('login.html'), 429, {'Retry-After': str(retry_after)}
+
         user = User.query.filter_by(username=username).first()
 
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+            if valid and user.password_needs_rehash():
+                # BCRYPT_LOG_ROUNDS changed since this hash was made; upgrade it while we have the password
+                user.set_password(password)
+                db.session.commit()
+        except HasherBusy as e:
+            current_app.logger.warning("Login refused, password hashing saturated: %s", password_hasher.stats())
+            flash(str(e), 'warning')
+            return render_template('login.html'), 503
+
+        if valid:
             login_user(user)
             flash('Login successful', 'success')
             return redirect(url_for('dashboard_routes.dashboard'))  # Change 'dashboard' to your actual route
@@ -1,7 +1,10 @@
 from flask import Blueprint, flash, request, jsonify, render_template, redirect, url_for
 from flask_login import login_required, current_user
+from sqlalchemy import func
 from app import db
-from .models import Budget, Category 
+from .models import Budget, BudgetAlert, BudgetSpend, Category
+from .record import parse_date_arg
+from .reference_data import get_reference_data
 
 # Create a blueprint for budget-related routes
 budgets_bp = Blueprint('budgets', __name__)
@@ -10,8 +13,8 @@ budgets_bp = Blueprint('budgets', __name__)
 @budgets_bp.route('/budgets', methods=['GET'])
 @login_required   
 def get_budgets():
-    # Fetch budgets for the current user
-    budgets = Budget.query.filter_by(user_id=current_user.id).all()
+    # Budgets with what was spent in their current period, in one query
+    budgets = Budget.list_with_spend(current_user.id)
     return render_template('budgets.html', budgets=budgets)
 
 from app import db
@@ -21,25 +24,48 @@ from app import db
 def add_budget():
     try:
         # Fetch user-specific expense categories
-        expense_categories = Category.query.filter_by(user_id=current_user.id, type='expense').all()
+        expense_categories = get_reference_data(current_user.id).expense_categories
 
-        # If no categories, create defaults
+        # If no categories, create the shared defaults
         if not expense_categories:
-            Category.create_default_categories(current_user.id)
-            expense_categories = Category.query.filter_by(user_id=current_user.id, type='expense').all()
+            Category.create_default_categories()
+            expense_categories = get_reference_data(current_user.id).expense_categories
 
         if request.method == 'POST':
             category_id = int(request.form.get('category_id'))
             amount = float(request.form.get('amount', 0.0))
+            period = request.form.get('period') or 'monthly'
+            start_date = parse_date_arg(request.form.get('start_date'))
+            end_date = parse_date_arg(request.form.get('end_date'))
+
+            # Checked against the database rather than the per-process reference data cache,
+            # which may not have seen a category created on another worker yet
+            category = Category.query.filter(
+                Category.id == category_id, func.lower(Category.type) == 'expense', Category.visible_to(current_user.id)
+            ).first()
+            if not category:
+                raise ValueError("Category not found.")
+            if period not in Budget.PERIODS:
+                raise ValueError(f"Unknown budget period '{period}'.")
+            if period == 'custom' and not (start_date and end_date and start_date <= end_date):
+                raise ValueError("A custom budget needs a start date on or before its end date.")
 
             # Create a new budget linked to an expense category
             new_budget = Budget(
                 user_id=current_user.id,
+                name=request.form.get('name') or category.name,
                 amount=amount,
-                category_id=category_id
+                category_id=category_id,
+                period=period,
+                start_date=start_date if period == 'custom' else None,
+                end_date=end_date if period == 'custom' else None,
+                currency=current_user.currency
             )
 
             db.session.add(new_budget)
+            db.session.flush()
+            # Spending already recorded in the category counts towards the new budget
+            Budget.rebuild_spend([new_budget.id])
             db.session.commit()
             flash('Budget added successfully!', 'success')
             return redirect(url_for('budgets.get_budgets'))
@@ -49,12 +75,22 @@ def add_budget():
             expense_categories=expense_categories
         )
     except Exception as e:
+        db.session.rollback()
         flash(f"Error adding budget: {str(e)}", 'danger')
         return redirect(url_for('budgets.get_budgets'))
 
 
 
 
+# Threshold alerts recorded by `flask evaluate-budget-alerts`
+@budgets_bp.route('/budgets/alerts', methods=['GET'])
+@login_required
+def get_budget_alerts():
+    alerts = BudgetAlert.query.filter_by(user_id=current_user.id) \
+        .order_by(BudgetAlert.created_at.desc()).limit(100).all()
+    return jsonify([alert.to_dict() for alert in alerts])
+
+
 # Route to update a budget's amount
 @budgets_bp.route('/budgets/<int:budget_id>', methods=['POST'])
 @login_required
@@ -84,6 +120,8 @@ def delete_budget(budget_id):
     if budget.user_id != current_user.id:
         return jsonify({'error': 'You do not have permission to delete this budget'}), 403
 
+    BudgetSpend.query.filter_by(budget_id=budget.id).delete()
+    BudgetAlert.query.filter_by(budget_id=budget.id).delete()
     db.session.delete(budget)
     db.session.commit()
     return redirect(url_for('budgets.get_budgets'))
@@ -0,0 +1,142 @@
+"""Result cache for analysis and overview data.
+
+Keys include the user's data_version, which every record or category write
+bumps, so a stale result is never served; old entries age out of the LRU.
+An optional Redis tier (CACHE_REDIS_URL) shares results between workers.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry time to live."""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared cache tier backed by Redis; values are stored as JSON."""
+
+    def __init__(self, url, prefix='expense-tracker:'):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except redis.RedisError:
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        try:
+            self.client.setex(self.prefix + key, int(ttl), json.dumps(value))
+        except redis.RedisError:
+            pass
+
+
+class ResultCache:
+    """Two-tier (local LRU, optional shared backend) cache for per-user results."""
+
+    def __init__(self, max_entries=1024, ttl=300, shared=None):
+        self.local = LRUCache(max_entries, ttl)
+        self.shared = shared
+
+    def configure(self, max_entries, ttl, shared=None):
+        self.local = LRUCache(max_entries, ttl)
+        self.shared = shared
+
+    @property
+    def hits(self):
+        return self.local.hits
+
+    @property
+    def misses(self):
+        return self.local.misses
+
+    @staticmethod
+    def make_key(kind, user_id, version, *params):
+        return ':'.join([kind, str(user_id), str(version)] + [str(param) for param in params])
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value, self.local.ttl)
+
+    def get_or_compute(self, kind, user_id, version, params, compute):
+        """Return the cached value for the key, computing and storing it on a miss."""
+        key = self.make_key(kind, user_id, version, *params)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+
+result_cache = ResultCache()
+
+
+def init_cache(app):
+    """Configure the result cache from the app config."""
+    shared = None
+    if app.config.get('CACHE_REDIS_URL'):
+        if redis is None:
+            app.logger.warning("CACHE_REDIS_URL is set but the 'redis' package is not installed; "
+                               "using the in-process cache only.")
+        else:
+            shared = RedisBackend(app.config['CACHE_REDIS_URL'])
+    result_cache.configure(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL'], shared)
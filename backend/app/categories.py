@@ -1,6 +1,7 @@
 from flask import Blueprint, flash, redirect, request, jsonify, render_template, url_for
 from app import db
-from app.models import Category
+from app.models import Budget, Category, DailyRollup, Record, User
+from app.reference_data import get_reference_data
 from flask_login import login_required, current_user
 
 categories_bp = Blueprint('categories', __name__)
@@ -9,14 +10,12 @@ categories_bp = Blueprint('categories', __name__)
 @login_required
 def categories_page():
     # Fetch categories only once
-    income_categories = Category.query.filter_by(user_id=current_user.id, type='Income').distinct().all()
-    expense_categories = Category.query.filter_by(user_id=current_user.id, type='Expense').distinct().all()
+    reference = get_reference_data(current_user.id)
 
-    # Pass the distinct categories to the template
     return render_template(
         'categories.html',
-        income_categories=income_categories,
-        expense_categories=expense_categories
+        income_categories=reference.income_categories,
+        expense_categories=reference.expense_categories
     )
 
 
@@ -24,11 +23,11 @@ def categories_page():
 @categories_bp.route('/categories', methods=['GET'])
 def get_categories():
     # Fetch all categories for the logged-in user, categorized by type (Income/Expense)
-    income_categories = Category.query.filter_by(user_id=current_user.id, type='Income').all()
-    expense_categories = Category.query.filter_by(user_id=current_user.id, type='Expense').all()
+    reference = get_reference_data(current_user.id)
 
     # Pass the categories to the template
-    return render_template('categories.html', income_categories=income_categories, expense_categories=expense_categories)
+    return render_template('categories.html', income_categories=reference.income_categories,
+                           expense_categories=reference.expense_categories)
 
 
 
@@ -51,22 +50,46 @@ def add_category():
     # Create and save the new category
     new_category = Category(user_id=current_user.id, name=name, type=type)
     db.session.add(new_category)
+    User.bump_data_version(current_user.id)
     db.session.commit()
 
     flash(f'{type} category "{name}" added successfully!', 'success')
     return redirect(url_for('categories.categories_page'))
 
 
+def _own_category(category_id):
+    """
+    The category as the current user may change it: their own row, their copy
+    of a shared default, or the shared default itself (changes to it are
+    copy-on-write). None if it belongs to someone else.
+    """
+    category = Category.query.get_or_404(category_id)
+    if category.user_id is None:
+        return Category.query.filter_by(user_id=current_user.id, default_id=category.id).first() or category
+    if category.user_id != current_user.id:
+        return None
+    return category
+
+
 @categories_bp.route('/category/edit/<int:category_id>', methods=['GET', 'POST'])
 @login_required
 def edit_category(category_id):
-    category = Category.query.get_or_404(category_id)
-    if category.user_id != current_user.id:
+    category = _own_category(category_id)
+    if category is None:
         flash('Unauthorized action', 'error')
         return redirect(url_for('categories.categories_page'))
+    if category.hidden:
+        # The user deleted this category (or the default it replaced)
+        flash('Category not found', 'error')
+        return redirect(url_for('categories.categories_page'))
 
     if request.method == 'POST':
-        category.name = request.form.get('name')
+        name = request.form.get('name')
+        if category.user_id is None:
+            Category.override_default(current_user.id, category, name=name)
+        else:
+            category.name = name
+        User.bump_data_version(current_user.id)
         db.session.commit()
         flash('Category updated successfully!', 'success')
         return redirect(url_for('categories.categories_page'))
@@ -76,12 +99,30 @@ def edit_category(category_id):
 @categories_bp.route('/category/delete/<int:category_id>', methods=['POST'])
 @login_required
 def delete_category(category_id):
-    category = Category.query.get_or_404(category_id)
-    if category.user_id != current_user.id:
+    category = _own_category(category_id)
+    if category is None:
         flash('Unauthorized action', 'error')
         return redirect(url_for('categories.categories_page'))
 
-    db.session.delete(category)
+    if category.user_id is not None and not category.default_id and (
+            Record.query.filter_by(category_id=category.id).first()
+            or Budget.query.filter_by(category_id=category.id).first()):
+        # The row would go, leaving records and budgets pointing at nothing
+        flash('This category is still used by records or budgets; move or delete them first.', 'warning')
+        return redirect(url_for('categories.categories_page'))
+
+    if category.user_id is None:
+        # Hide the shared default for this user only
+        Category.override_default(current_user.id, category, hidden=True)
+    elif category.default_id:
+        # Keep the copy (hidden) so the shared default it replaced stays hidden too
+        category.hidden = True
+    else:
+        # Unused, so its rollup rows are only zero-count leftovers of records moved away
+        DailyRollup.query.filter_by(user_id=current_user.id, category_id=category.id) \
+            .delete(synchronize_session=False)
+        db.session.delete(category)
+    User.bump_data_version(current_user.id)
     db.session.commit()
     flash('Category deleted successfully!', 'success')
     return redirect(url_for('categories.categories_page'))
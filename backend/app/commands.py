@@ -0,0 +1,140 @@
+"""Flask CLI maintenance commands, registered in create_app()."""
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+
+from .currency import currency_cache
+from .fx import current_rates
+from .models import Budget, BudgetAlert, Category, DailyRollup, FxRate, User, UserTotals, db
+from .provisioning import backfill_defaults
+
+
+@click.command('rebuild-totals')
+@with_appcontext
+def rebuild_totals_command():
+    """Recompute the per-user and per-account totals tables from records."""
+    UserTotals.rebuild()
+    click.echo("Totals rebuilt from records.")
+
+
+@click.command('verify-totals')
+@with_appcontext
+def verify_totals_command():
+    """Check the totals tables against a fresh aggregation of records."""
+    mismatches = UserTotals.verify()
+    for kind, key, stored, expected in mismatches:
+        click.echo(f"{kind} {key}: stored (income, expense, count)={stored} expected={expected}", err=True)
+    if mismatches:
+        raise click.ClickException(f"{len(mismatches)} totals rows are out of date; run 'flask rebuild-totals'.")
+    click.echo("Totals match records.")
+
+
+@click.command('rebuild-rollups')
+@click.option('--chunk-size', default=1000, show_default=True, help='Users rebuilt per transaction.')
+@with_appcontext
+def rebuild_rollups_command(chunk_size):
+    """Recompute the daily rollups (and budget spend) from records, a chunk of users at a time."""
+    last_id = 0
+    rebuilt = 0
+    while True:
+        user_ids = [user_id for user_id, in db.session.query(User.id)
+                    .filter(User.id > last_id).order_by(User.id).limit(chunk_size)]
+        if not user_ids:
+            break
+        try:
+            DailyRollup.rebuild(user_ids)
+            # Budget spend is derived from the rollups
+            Budget.rebuild_spend(user_ids=user_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        rebuilt += len(user_ids)
+        last_id = user_ids[-1]
+        click.echo(f"Rebuilt rollups for {rebuilt} users (up to id {last_id}).")
+    click.echo("Rollups rebuilt from records.")
+
+
+@click.command('refresh-currencies')
+@with_appcontext
+def refresh_currencies_command():
+    """Fetch exchange rates from the provider now and update the snapshot."""
+    if not currency_cache.refresh():
+        raise click.ClickException("Could not fetch rates; the cached snapshot is unchanged.")
+    click.echo(f"Fetched {len(currency_cache.rates)} rates.")
+
+
+@click.command('update-fx-rates')
+@with_appcontext
+def update_fx_rates_command():
+    """Store today's exchange rates from the provider in the fx_rates table (run daily)."""
+    if not currency_cache.refresh():
+        raise click.ClickException("Could not fetch rates from the provider.")
+    FxRate.store(currency_cache.rates)
+    click.echo(f"Stored {len(currency_cache.rates)} rates for today.")
+
+
+@click.command('evaluate-budget-alerts')
+@click.option('--chunk-size', default=1000, show_default=True, help='Budgets evaluated per transaction.')
+@with_appcontext
+def evaluate_budget_alerts_command(chunk_size):
+    """Record 50/80/100% crossings for every active budget (safe to rerun; schedule it)."""
+    rates = current_rates()[1]
+    started = time.perf_counter()
+    last_id = 0
+    evaluated = recorded = retries = 0
+    while True:
+        try:
+            next_id, chunk_evaluated, chunk_recorded = BudgetAlert.evaluate_chunk(last_id, chunk_size, rates)
+            db.session.commit()
+        except IntegrityError:
+            # Another run recorded some of these alerts first; evaluate the chunk again
+            db.session.rollback()
+            retries += 1
+            if retries > 3:
+                raise
+            continue
+        retries = 0
+        if next_id is None:
+            break
+        last_id = next_id
+        evaluated += chunk_evaluated
+        recorded += chunk_recorded
+        elapsed = time.perf_counter() - started
+        click.echo(f"Evaluated {evaluated} budgets (up to id {last_id}), {recorded} new alerts, "
+                   f"{evaluated / elapsed:.0f} budgets/sec.")
+    elapsed = time.perf_counter() - started
+    click.echo(f"Done: {evaluated} budgets, {recorded} new alerts in {elapsed:.2f}s.")
+
+
+@click.command('backfill-defaults')
+@click.option('--chunk-size', default=10000, show_default=True, help='Users backfilled per transaction.')
+@with_appcontext
+def backfill_defaults_command(chunk_size):
+    """Create missing default categories, settings and accounts for all users (safe to rerun)."""
+    started = time.perf_counter()
+    Category.create_default_categories()
+
+    def report(users, settings, accounts, last_id):
+        elapsed = time.perf_counter() - started
+        click.echo(f"Checked {users} users (up to id {last_id}): {settings} settings and {accounts} accounts "
+                   f"added, {users / elapsed:.0f} users/sec.")
+
+    users, settings, accounts = backfill_defaults(chunk_size, report)
+    elapsed = time.perf_counter() - started
+    click.echo(f"Done: {users} users, {settings} settings and {accounts} accounts added in {elapsed:.2f}s.")
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_totals_command)
+    app.cli.add_command(verify_totals_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(refresh_currencies_command)
+    app.cli.add_command(update_fx_rates_command)
+    app.cli.add_command(evaluate_budget_alerts_command)
+    app.cli.add_command(backfill_defaults_command)
+
+    from .synthetic import generate_data_command
+    app.cli.add_command(generate_data_command)
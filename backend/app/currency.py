@@ -0,0 +1,166 @@
+"""Currency list and exchange rates.
+
+Rates come from a pluggable provider and are cached in process with a TTL,
+backed by an on-disk snapshot used whenever the provider is unavailable.
+Stale rates are refreshed in the background; failed fetches are retried no
+sooner than CURRENCY_RETRY_AFTER.
+"""
+import json
+import os
+import threading
+import time
+from importlib import import_module
+
+import requests
+
+# Used when there is neither a snapshot nor a reachable provider
+FALLBACK_RATES = {'USD': 1.0}
+
+
+class ExchangeRateApiProvider:
+    """Fetches latest rates from exchangerate-api.com (base currency in the URL)."""
+
+    def __init__(self, url, timeout=3.0):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch_rates(self):
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('result') != 'success':
+            raise ValueError(f"Currency API returned '{data.get('result')}'.")
+        return data['conversion_rates']
+
+
+class StaticRatesProvider:
+    """Returns a fixed set of rates; for tests and offline development."""
+
+    def __init__(self, rates=None):
+        self.rates = dict(rates or FALLBACK_RATES)
+
+    def fetch_rates(self):
+        return dict(self.rates)
+
+
+class CurrencyCache:
+    """TTL cache of currency rates backed by a provider and an on-disk snapshot."""
+
+    def __init__(self, provider=None, ttl=3600, snapshot_path=None, retry_after=60):
+        self.provider = provider or StaticRatesProvider()
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.retry_after = retry_after
+        self.rates = {}
+        self.fetched_at = 0.0
+        self.failed_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def configure(self, provider, ttl, snapshot_path, retry_after=60):
+        with self._lock:
+            self.provider = provider
+            self.ttl = ttl
+            self.snapshot_path = snapshot_path
+            self.retry_after = retry_after
+            self.rates = {}
+            self.fetched_at = 0.0
+            self.failed_at = None
+        self.load_snapshot()
+
+    def load_snapshot(self):
+        """Seed the cache from the snapshot file, if there is one."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as snapshot:
+                data = json.load(snapshot)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self.rates = data.get('rates') or {}
+            self.fetched_at = data.get('fetched_at', 0.0)
+        return bool(self.rates)
+
+    def _save_snapshot(self, rates, fetched_at):
+        if not self.snapshot_path:
+            return
+        os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+        # Write then rename, so a crash never leaves a half-written snapshot behind
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as snapshot:
+            json.dump({'fetched_at': fetched_at, 'rates': rates}, snapshot)
+        os.replace(temp_path, self.snapshot_path)
+
+    def refresh(self):
+        """Fetch rates from the provider now. Returns True on success."""
+        try:
+            rates = self.provider.fetch_rates()
+        except Exception:
+            rates = None
+        if not rates:
+            self.failed_at = time.time()
+            return False
+        fetched_at = time.time()
+        with self._lock:
+            self.rates = rates
+            self.fetched_at = fetched_at
+            self.failed_at = None
+        try:
+            self._save_snapshot(rates, fetched_at)
+        except OSError:
+            pass
+        return True
+
+    def _backing_off(self):
+        return self.failed_at is not None and time.time() - self.failed_at < self.retry_after
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='currency-refresh', daemon=True).start()
+
+    def get_rates(self):
+        """
+        Return the cached rates. Stale rates are returned immediately while a
+        refresh runs in the background; only a completely empty cache (no
+        snapshot yet) waits for the provider, bounded by its timeout, and not
+        again until retry_after seconds after a failure.
+        """
+        if not self.rates:
+            if self._backing_off() or not self.refresh():
+                return dict(FALLBACK_RATES)
+        elif time.time() - self.fetched_at > self.ttl and not self._backing_off():
+            self._refresh_in_background()
+        return self.rates
+
+
+currency_cache = CurrencyCache()
+
+
+def load_provider(app):
+    """Build the provider named by CURRENCY_PROVIDER ('exchangerate-api', 'static' or 'module:Class')."""
+    name = app.config['CURRENCY_PROVIDER']
+    if name == 'exchangerate-api':
+        return ExchangeRateApiProvider(app.config['CURRENCY_API_URL'], app.config['CURRENCY_FETCH_TIMEOUT'])
+    if name == 'static':
+        return StaticRatesProvider()
+    module_name, _, class_name = name.partition(':')
+    return getattr(import_module(module_name), class_name)()
+
+
+def init_currency(app):
+    """Configure the currency cache from the app config and load the snapshot."""
+    snapshot_path = app.config.get('CURRENCY_SNAPSHOT_PATH') or \
+        os.path.join(app.instance_path, 'currency_rates.json')
+    currency_cache.configure(load_provider(app), app.config['CURRENCY_CACHE_TTL'], snapshot_path,
+                             app.config['CURRENCY_RETRY_AFTER'])
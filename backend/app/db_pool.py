@@ -0,0 +1,92 @@
+"""Connection pool settings (DB_POOL_*) and checkout wait metrics."""
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStats:
+    """Checkout wait times and timeouts, for every pool in this process."""
+
+    def __init__(self, slow_threshold=0.5):
+        self._lock = threading.Lock()
+        self.slow_threshold = slow_threshold
+        self.logger = None
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if timed_out:
+                self.timeouts += 1
+            slow = waited >= self.slow_threshold
+            if slow:
+                self.slow_checkouts += 1
+        if slow and self.logger:
+            self.logger.warning("Waited %.3fs for a database connection%s", waited,
+                                " and timed out" if timed_out else "")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'wait_seconds_total': self.wait_seconds,
+                'wait_seconds_max': self.max_wait_seconds,
+                'slow_checkouts': self.slow_checkouts,
+                'timeouts': self.timeouts,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_stats.record(time.perf_counter() - started)
+        return connection
+
+
+def pool_status(engine):
+    """Current pool occupancy plus the wait statistics, as a dict."""
+    pool = engine.pool
+    status = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    status.update(pool_stats.snapshot())
+    return status
+
+
+def configure_pool(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* settings; call before db.init_app."""
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    # SQLite doesn't pool connections the same way; keep Flask-SQLAlchemy's defaults for it
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options.setdefault('poolclass', TimedQueuePool)
+        options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', app.config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', app.config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', app.config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', app.config['DB_POOL_PRE_PING'])
+    pool_stats.slow_threshold = app.config['DB_POOL_SLOW_CHECKOUT']
+    pool_stats.logger = app.logger
@@ -0,0 +1,118 @@
+"""Streaming CSV/JSON export of a user's records, in constant memory."""
+import csv
+import io
+import json
+import zlib
+
+from .models import Account, Category, Record, db
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = ['id', 'date', 'type', 'amount', 'currency', 'account', 'category', 'description']
+
+
+def iter_export_rows(username, start_date=None, end_date=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield one dict per record for a user, oldest first, without loading ORM objects."""
+    query = db.session.query(
+        Record.id,
+        Record.date,
+        Record.total_income,
+        Record.total_expense,
+        Record.currency,
+        Account.account_type,
+        Category.name,
+        Record.description
+    ).outerjoin(Account, Record.account_id == Account.id) \
+     .outerjoin(Category, Record.category_id == Category.id) \
+     .filter(Record.username == username)
+
+    if start_date:
+        query = query.filter(Record.date >= start_date)
+    if end_date:
+        query = query.filter(Record.date <= end_date)
+
+    # stream_results asks the driver for a server-side cursor; yield_per keeps
+    # only one batch of rows in memory at a time
+    query = query.order_by(Record.date, Record.id) \
+                 .execution_options(stream_results=True, yield_per=batch_size)
+
+    for record_id, record_date, income, expense, currency, account, category, description in query:
+        is_income = (income or 0) > 0
+        yield {
+            'id': record_id,
+            'date': record_date.isoformat() if record_date else None,
+            'type': 'income' if is_income else 'expense',
+            'amount': income if is_income else (expense or 0.0),
+            'currency': currency,
+            'account': account,
+            'category': category,
+            'description': description or '',
+        }
+
+
+def stream_csv(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Render rows as CSV text, yielding one chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def stream_json(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Render rows as a JSON array, yielding one chunk per batch of rows."""
+    chunk = ['[']
+    for count, row in enumerate(rows):
+        chunk.append((',' if count else '') + json.dumps(row))
+        if len(chunk) >= batch_size:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append(']')
+    yield ''.join(chunk)
+
+
+def gzip_stream(chunks):
+    """Gzip-compress a stream of text chunks on the fly."""
+    # wbits=31 produces a gzip container rather than a raw zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def write_export(path, username, export_format='csv', compress=False, start_date=None, end_date=None, progress=None):
+    """
+    Write a full export to a file (used by background export jobs) and return
+    the number of records written. `progress` is called with the running count.
+    """
+    written = 0
+
+    def counted(rows):
+        nonlocal written
+        for row in rows:
+            written += 1
+            if progress and written % EXPORT_BATCH_SIZE == 0:
+                progress(written)
+            yield row
+
+    rows = counted(iter_export_rows(username, start_date=start_date, end_date=end_date))
+    chunks = stream_csv(rows) if export_format == 'csv' else stream_json(rows)
+
+    if compress:
+        with open(path, 'wb') as output:
+            for data in gzip_stream(chunks):
+                output.write(data)
+    else:
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+
+    return written
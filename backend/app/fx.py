@@ -0,0 +1,48 @@
+"""Currency conversion for summaries and charts.
+
+Amounts are summed per currency in SQL, then converted here with one set of
+rates per request: the latest day in fx_rates, or the currency cache while
+that table is empty.
+"""
+from flask import g, has_request_context
+
+from .currency import currency_cache
+from .models import FxRate
+
+
+def current_rates():
+    """Return (rates_day, {currency: units per USD}), loaded at most once per request."""
+    if has_request_context() and 'fx_rates' in g:
+        return g.fx_rates
+
+    day = FxRate.latest_day()
+    rates = FxRate.rates_for(day) if day else dict(currency_cache.get_rates())
+    result = (day, rates)
+
+    if has_request_context():
+        g.fx_rates = result
+    return result
+
+
+def conversion_factor(from_currency, to_currency, rates):
+    """Multiplier that turns an amount in `from_currency` into `to_currency`."""
+    if not to_currency or from_currency == to_currency:
+        return 1.0
+    try:
+        return rates[to_currency] / rates[from_currency]
+    except KeyError as e:
+        raise ValueError(f"No exchange rate available for {e.args[0]}.")
+
+
+def convert_sums(rows, to_currency):
+    """Convert (currency, income, expense) rows into one (income, expense) total."""
+    # Rates are only looked up when something actually needs converting
+    needs_rates = to_currency and any(currency != to_currency for currency, _, _ in rows)
+    rates = current_rates()[1] if needs_rates else {}
+
+    total_income = total_expense = 0.0
+    for currency, income, expense in rows:
+        factor = conversion_factor(currency, to_currency, rates)
+        total_income += (income or 0.0) * factor
+        total_expense += (expense or 0.0) * factor
+    return total_income, total_expense
@@ -0,0 +1,290 @@
+"""Bulk import of records from bank statement files.
+
+Rows are parsed as a stream and inserted in chunks, so memory stays bounded;
+bad rows are reported and skipped.
+"""
+import csv
+import io
+import re
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+from .models import Account, BudgetSpend, Category, DailyRollup, Record, User, UserTotals, db
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+# Date formats accepted in the CSV 'date' column
+CSV_DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y/%m/%d']
+
+
+class ImportResult:
+    """Running totals for one import, including a capped list of per-row errors."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.failed += 1
+        # Only keep the first errors so a completely broken file can't exhaust memory
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_sec(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+
+def parse_date(value, formats=CSV_DATE_FORMATS):
+    value = value.strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date '{value}'.")
+
+
+class RowError(ValueError):
+    """A statement line that couldn't be parsed; yielded in place of its row."""
+
+
+def parse_csv(stream):
+    """
+    Yield (line_number, row) pairs from a CSV statement.
+
+    Expected columns: date, amount, and optionally type, account, category, description.
+    When 'type' is missing the sign of 'amount' decides (negative means expense).
+    Lines that aren't valid CSV or have more fields than the header are
+    yielded as (line_number, RowError) so the import can skip them.
+    """
+    reader = csv.DictReader(stream)
+    while True:
+        # DictReader only updates its own line_num after a good row; ask the underlying reader
+        line_num = reader.reader.line_num
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield reader.reader.line_num, RowError(f"Malformed CSV: {e}")
+            if reader.reader.line_num == line_num:
+                return  # the reader can't get past this point
+            continue
+        if None in row:
+            yield reader.line_num, RowError(
+                f"Row has {len(reader.fieldnames) + len(row[None])} fields, "
+                f"expected {len(reader.fieldnames)}."
+            )
+            continue
+        # Normalise header names so 'Date' and ' date ' both work
+        yield reader.line_num, {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+
+
+def parse_ofx(stream):
+    """
+    Yield (line_number, row) pairs from an OFX/QFX statement.
+
+    Only the <STMTTRN> blocks are read, line by line, so the whole document is
+    never held in memory. Works for both SGML (OFX 1.x) and XML (OFX 2.x) files.
+    """
+    tag_pattern = re.compile(r'<([A-Z0-9.]+)>([^<\r\n]*)', re.IGNORECASE)
+    transaction = None
+    start_line = 0
+
+    for line_number, line in enumerate(stream, start=1):
+        for tag, value in tag_pattern.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                transaction = {}
+                start_line = line_number
+            elif transaction is not None and value:
+                transaction[tag] = value.strip()
+        if transaction is not None and '</STMTTRN>' in line.upper():
+            posted = transaction.get('DTPOSTED', '')
+            yield start_line, {
+                # DTPOSTED looks like 20240131120000[-5:EST]; the first 8 digits are the date
+                'date': posted[:8],
+                'amount': transaction.get('TRNAMT', ''),
+                'description': transaction.get('MEMO') or transaction.get('NAME', ''),
+            }
+            transaction = None
+
+
+def _resolve_row(row, accounts, categories, default_account_id):
+    """Turn one parsed row into insert parameters for the records table."""
+    amount = float(row.get('amount', '').replace(',', ''))
+    record_type = row.get('type', '').lower()
+    if record_type not in ('income', 'expense'):
+        record_type = 'expense' if amount < 0 else 'income'
+    amount = abs(amount)
+
+    account_name = row.get('account', '')
+    if account_name:
+        account_id = accounts.get(account_name.lower())
+        if account_id is None:
+            raise ValueError(f"Unknown account '{account_name}'.")
+    elif default_account_id:
+        account_id = default_account_id
+    else:
+        raise ValueError("No account given for row and no default account selected.")
+
+    category_id = None
+    category_name = row.get('category', '')
+    if category_name:
+        category_id = categories.get((category_name.lower(), record_type))
+        if category_id is None:
+            raise ValueError(f"Unknown {record_type} category '{category_name}'.")
+
+    raw_date = row.get('date', '')
+    transaction_date = parse_date(raw_date, ['%Y%m%d']) if raw_date.isdigit() else parse_date(raw_date)
+
+    return {
+        'account_id': account_id,
+        'category_id': category_id,
+        'total_income': amount if record_type == 'income' else 0.0,
+        'total_expense': amount if record_type == 'expense' else 0.0,
+        'description': row.get('description', '')[:255],
+        'date_range': transaction_date.strftime('%Y-%m-%d'),
+        'date': transaction_date,
+    }
+
+
+def import_records(user, rows, default_account_id=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Insert parsed statement rows for a user in chunked multi-row batches.
+
+    The user's accounts and categories are loaded once up front and names are
+    resolved from memory. Each chunk is committed on its own, so a failure in
+    one chunk never rolls back rows that were already imported. `progress`, if
+    given, is called with the number of rows handled so far after every chunk.
+    """
+    account_rows = db.session.query(Account.id, Account.account_type, Account.currency) \
+        .filter_by(user_id=user.id).all()
+    accounts = {account_type.lower(): account_id for account_id, account_type, _ in account_rows}
+    account_currencies = {account_id: currency for account_id, _, currency in account_rows}
+    categories = {
+        (name.lower(), category_type.lower()): category_id
+        for category_id, name, category_type in db.session.query(Category.id, Category.name, Category.type)
+        .filter(Category.visible_to(user.id))
+    }
+    if default_account_id and default_account_id not in accounts.values():
+        raise ValueError("Default account does not belong to this user.")
+
+    result = ImportResult()
+    batch = []
+    batch_lines = []
+
+    def flush():
+        try:
+            # executemany on a Core insert becomes a multi-row INSERT on our drivers
+            db.session.execute(Record.__table__.insert(), batch)
+            # One totals update per account and one rollup update per (day, category)
+            # touched by the chunk, in the same transaction as the insert
+            by_account = {}
+            by_day = {}
+            for params in batch:
+                for deltas, key in ((by_account, params['account_id']),
+                                    (by_day, (params['date'], params['category_id'], params['currency']))):
+                    income, expense, count = deltas.get(key, (0.0, 0.0, 0))
+                    deltas[key] = (income + params['total_income'], expense + params['total_expense'], count + 1)
+            User.bump_data_version(user.id)
+            for account_id, (income, expense, count) in by_account.items():
+                UserTotals.apply(user.id, account_id, income, expense, count)
+            for (day, category_id, currency), (income, expense, count) in by_day.items():
+                DailyRollup.apply(user.id, day, category_id, currency, income, expense, count)
+            BudgetSpend.apply(user.id, by_day)
+            db.session.commit()
+            result.imported += len(batch)
+        except Exception as e:
+            db.session.rollback()
+            for line in batch_lines:
+                result.add_error(line, f"Batch insert failed: {e}")
+        batch.clear()
+        batch_lines.clear()
+        if progress:
+            progress(result.imported + result.failed)
+
+    for line, row in rows:
+        if isinstance(row, RowError):
+            result.add_error(line, str(row))
+            continue
+        try:
+            params = _resolve_row(row, accounts, categories, default_account_id)
+        except (ValueError, KeyError) as e:
+            result.add_error(line, str(e))
+            continue
+        params['username'] = user.username
+        params['currency'] = account_currencies[params['account_id']]
+        batch.append(params)
+        batch_lines.append(line)
+        if len(batch) >= chunk_size:
+            flush()
+
+    if batch:
+        flush()
+
+    return result.finish()
+
+
+def open_statement(stream, file_format):
+    """Wrap a binary stream in the parser for its format ('csv' or 'ofx')."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    if file_format == 'ofx':
+        return parse_ofx(text)
+    if file_format == 'csv':
+        return parse_csv(text)
+    raise ValueError(f"Unsupported file format '{file_format}'.")
+
+
+@click.command('import-records')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ofx']), default=None,
+              help='Statement format; guessed from the file extension when omitted.')
+@click.option('--account', 'account_name', default=None, help='Account to use for rows without one.')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help='Rows per INSERT batch.')
+@with_appcontext
+def import_records_command(username, path, file_format, account_name, chunk_size):
+    """Import records for USERNAME from the statement file at PATH."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f"User '{username}' not found.")
+
+    default_account_id = None
+    if account_name:
+        account = Account.query.filter_by(user_id=user.id, account_type=account_name).first()
+        if not account:
+            raise click.ClickException(f"Account '{account_name}' not found for '{username}'.")
+        default_account_id = account.id
+
+    file_format = file_format or ('ofx' if path.lower().endswith(('.ofx', '.qfx')) else 'csv')
+
+    with open(path, 'rb') as stream:
+        result = import_records(user, open_statement(stream, file_format),
+                                default_account_id=default_account_id, chunk_size=chunk_size)
+
+    for line, message in result.errors:
+        click.echo(f"line {line}: {message}", err=True)
+    click.echo(f"Imported {result.imported} records, {result.failed} failed "
+               f"in {result.elapsed:.2f}s ({result.rows_per_sec:.0f} rows/sec).")
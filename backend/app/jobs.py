@@ -0,0 +1,363 @@
+"""Background jobs: analyses, imports and exports run by `flask run-worker`.
+
+Jobs are rows in the jobs table. Failures are retried with backoff, a
+heartbeat thread marks running jobs alive, and jobs whose worker died are
+reclaimed while they have attempts left. Job files are removed when done
+or after JOB_FILES_TTL.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import click
+from flask import Blueprint, current_app, jsonify, send_file, url_for
+from flask.cli import with_appcontext
+from flask_login import current_user, login_required
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from .models import Analysis, Job, User, db
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+# kind -> function(job, report_progress) returning a JSON-serialisable result
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def job_files_dir():
+    """Directory for uploaded statements and finished exports, created on first use."""
+    path = current_app.config.get('JOB_FILES_DIR') or os.path.join(current_app.instance_path, 'jobs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_upload(upload):
+    """Save an uploaded file where workers can read it and return its path."""
+    path = os.path.join(job_files_dir(), f"upload-{uuid.uuid4().hex}")
+    upload.save(path)
+    return path
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def sweep_job_files(ttl):
+    """Delete job files (finished exports, abandoned uploads) older than ttl seconds."""
+    directory = job_files_dir()
+    cutoff = time.time() - ttl
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            _remove_file(entry.path)
+            removed += 1
+    return removed
+
+
+def enqueue(user_id, kind, payload=None, max_attempts=None):
+    """Queue a job for the workers and return it."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'.")
+    job = Job(
+        user_id=user_id,
+        kind=kind,
+        payload=payload or {},
+        max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS']
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _abandoned(now, timeout):
+    # The worker running this job stopped sending heartbeats
+    return and_(Job.status == Job.RUNNING, Job.heartbeat_at < now - timedelta(seconds=timeout))
+
+
+def _runnable(now, timeout):
+    return or_(
+        and_(Job.status == Job.QUEUED, Job.run_after <= now),
+        # Abandoned jobs count as a failed attempt; they are only run again if they have attempts left
+        and_(_abandoned(now, timeout), Job.attempts < Job.max_attempts)
+    )
+
+
+def fail_abandoned_jobs(timeout):
+    """Mark abandoned jobs that have no attempts left as failed. Returns how many were."""
+    now = _utcnow()
+    exhausted = and_(_abandoned(now, timeout), Job.attempts >= Job.max_attempts)
+    failed = 0
+    for job_id, kind, payload in db.session.query(Job.id, Job.kind, Job.payload).filter(exhausted).all():
+        failed += db.session.execute(
+            Job.__table__.update()
+            .where(Job.__table__.c.id == job_id, exhausted)
+            .values(status=Job.FAILED, finished_at=now, error='The worker running this job stopped responding.')
+        ).rowcount
+        if kind == 'import':
+            _remove_file(payload['path'])
+    db.session.commit()
+    return failed
+
+
+def claim_next_job(timeout):
+    """
+    Atomically take the oldest runnable job. The conditional UPDATE only succeeds
+    for one worker, so the same job is never run twice concurrently.
+    """
+    now = _utcnow()
+    candidates = db.session.query(Job.id).filter(_runnable(now, timeout)) \
+        .order_by(Job.run_after, Job.id).limit(10).all()
+
+    for job_id, in candidates:
+        claimed = db.session.execute(
+            Job.__table__.update()
+            .where(Job.__table__.c.id == job_id, _runnable(now, timeout))
+            .values(status=Job.RUNNING, started_at=now, heartbeat_at=now, attempts=Job.__table__.c.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def _report_progress(job_id, progress=None):
+    # Own connection and transaction, so progress is visible while the job's work is still uncommitted
+    values = {'heartbeat_at': _utcnow()}
+    if progress is not None:
+        values['progress'] = progress
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(Job.__table__.update().where(Job.__table__.c.id == job_id).values(**values))
+    except SQLAlchemyError as e:
+        # e.g. SQLite can't write while the job holds a write lock; enough misses and the job looks abandoned
+        current_app.logger.warning("Could not record heartbeat for job %s: %s", job_id, e)
+
+
+class Heartbeat(threading.Thread):
+    """Refreshes a running job's heartbeat until stopped, whatever its handler is doing."""
+
+    def __init__(self, app, job_id, interval):
+        super().__init__(daemon=True)
+        self.app = app
+        self.job_id = job_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with self.app.app_context():
+                _report_progress(self.job_id)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job, timeout=None):
+    """Execute one claimed job and record its outcome."""
+    job_id = job.id
+    handler = JOB_HANDLERS.get(job.kind)
+    timeout = timeout or current_app.config['JOB_TIMEOUT']
+    heartbeat = Heartbeat(current_app._get_current_object(), job_id, max(timeout / 3, 1))
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise ValueError(f"No handler for job kind '{job.kind}'.")
+        result = handler(job, lambda progress: _report_progress(job_id, progress))
+    except Exception as e:
+        heartbeat.stop()
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.error = str(e)
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = _utcnow() + timedelta(seconds=2 ** job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = _utcnow()
+        db.session.commit()
+        current_app.logger.warning("Job %s (%s) failed on attempt %s: %s", job_id, job.kind, job.attempts, e)
+        return
+
+    heartbeat.stop()
+    job = db.session.get(Job, job_id)
+    job.status = Job.SUCCEEDED
+    job.result = result
+    job.error = None
+    job.finished_at = _utcnow()
+    db.session.commit()
+
+
+def work(poll_interval=1.0, timeout=300, burst=False):
+    """Run jobs until interrupted (or, with burst=True, until the queue is empty)."""
+    next_cleanup = 0
+    while True:
+        if time.monotonic() >= next_cleanup:
+            fail_abandoned_jobs(timeout)
+            sweep_job_files(current_app.config['JOB_FILES_TTL'])
+            next_cleanup = time.monotonic() + timeout
+        job = claim_next_job(timeout)
+        if job is None:
+            if burst:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_job(job, timeout)
+
+
+def _worker_process(poll_interval, timeout, burst):
+    # Each process builds its own app, and with it its own engine and connection pool
+    from . import create_app
+    app = create_app()
+    with app.app_context():
+        try:
+            work(poll_interval, timeout, burst)
+        except KeyboardInterrupt:
+            pass
+
+
+@click.command('run-worker')
+@click.option('--processes', default=None, type=int, help='Worker processes (default: number of CPUs).')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+@with_appcontext
+def run_worker_command(processes, burst):
+    """Run background jobs from the jobs table."""
+    processes = processes or os.cpu_count() or 1
+    poll_interval = current_app.config['JOB_POLL_INTERVAL']
+    timeout = current_app.config['JOB_TIMEOUT']
+
+    if processes == 1:
+        work(poll_interval, timeout, burst)
+        return
+
+    workers = [
+        multiprocessing.Process(target=_worker_process, args=(poll_interval, timeout, burst), daemon=True)
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    click.echo(f"Started {processes} job workers.")
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+def _parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+@job_handler('analysis')
+def run_analysis_job(job, report_progress):
+    payload = job.payload
+    analysis = Analysis.create_analysis(
+        job.user_id,
+        payload['granularity'],
+        _parse_date(payload.get('start_date')),
+        _parse_date(payload.get('end_date'))
+    )
+    return {'analysis_id': analysis.id}
+
+
+@job_handler('import')
+def run_import_job(job, report_progress):
+    from .importer import import_records, open_statement
+
+    payload = job.payload
+    user = db.session.get(User, job.user_id)
+    try:
+        with open(payload['path'], 'rb') as stream:
+            result = import_records(
+                user,
+                open_statement(stream, payload['format']),
+                default_account_id=payload.get('default_account_id'),
+                progress=report_progress
+            )
+    finally:
+        # Imports are never retried (they commit as they go), so the upload isn't needed again
+        _remove_file(payload['path'])
+    return result.to_dict()
+
+
+@job_handler('export')
+def run_export_job(job, report_progress):
+    from .exporter import write_export
+
+    payload = job.payload
+    user = db.session.get(User, job.user_id)
+    extension = payload['format'] + ('.gz' if payload.get('gzip') else '')
+    path = os.path.join(job_files_dir(), f"export-{job.id}.{extension}")
+    try:
+        written = write_export(
+            path,
+            user.username,
+            export_format=payload['format'],
+            compress=payload.get('gzip', False),
+            start_date=_parse_date(payload.get('start_date')),
+            end_date=_parse_date(payload.get('end_date')),
+            progress=report_progress
+        )
+    except Exception:
+        _remove_file(path)
+        raise
+    return {'path': path, 'filename': f"records-{user.username}.{extension}", 'records': written}
+
+
+@jobs_bp.route('', methods=['GET'])
+@login_required
+def list_jobs():
+    """
+    The logged-in user's most recent jobs.
+    """
+    jobs = Job.query.filter_by(user_id=current_user.id).order_by(Job.id.desc()).limit(50).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    """
+    Status, progress and result of one job.
+    """
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    status = job.to_dict()
+    if job.kind == 'export' and job.status == Job.SUCCEEDED:
+        status['download_url'] = url_for('jobs.download_job_result', job_id=job.id)
+    return jsonify(status)
+
+
+@jobs_bp.route('/<int:job_id>/download', methods=['GET'])
+@login_required
+def download_job_result(job_id):
+    """
+    Download the file produced by a finished export job.
+    """
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id, kind='export').first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != Job.SUCCEEDED:
+        return jsonify({'error': 'Export is not ready yet', 'status': job.status}), 409
+    if not os.path.exists(job.result['path']):
+        return jsonify({'error': 'Export has expired; please export again'}), 410
+    return send_file(job.result['path'], as_attachment=True, download_name=job.result['filename'])
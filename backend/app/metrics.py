@@ -0,0 +1,167 @@
+"""Request metrics in the Prometheus text format.
+
+Latency histograms, status counts and in-flight gauges per endpoint, plus
+gauges for the pool, caches, password hashing and login throttling.
+"""
+import bisect
+import threading
+import time
+
+from flask import g, request
+
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class RequestMetrics:
+    """Latency histograms, status counts and in-flight requests per endpoint."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.configure(buckets)
+
+    def configure(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms = {}  # (endpoint, method) -> [bucket counts..., +Inf count, sum]
+        self._statuses = {}  # (endpoint, method, status) -> count
+        self._in_flight = {}  # endpoint -> count
+
+    def started(self, endpoint):
+        with self._lock:
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+
+    def finished(self, endpoint, method, status, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._in_flight[endpoint] -= 1
+            histogram = self._histograms.get((endpoint, method))
+            if histogram is None:
+                histogram = self._histograms[(endpoint, method)] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += seconds
+            key = (endpoint, method, status)
+            self._statuses[key] = self._statuses.get(key, 0) + 1
+
+    def render(self):
+        with self._lock:
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+            statuses = dict(self._statuses)
+            in_flight = dict(self._in_flight)
+
+        lines = ['# HELP http_request_duration_seconds Request latency by endpoint.',
+                 '# TYPE http_request_duration_seconds histogram']
+        for (endpoint, method), values in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket'
+                             f'{_labels(endpoint=endpoint, method=method, le=bound)} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{_labels(endpoint=endpoint, method=method)} {values[-1]}')
+            lines.append(f'http_request_duration_seconds_count{_labels(endpoint=endpoint, method=method)} {cumulative}')
+
+        lines += ['# HELP http_requests_total Completed requests by endpoint and status.',
+                  '# TYPE http_requests_total counter']
+        for (endpoint, method, status), count in sorted(statuses.items()):
+            lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+        lines += ['# HELP http_requests_in_flight Requests being handled right now.',
+                  '# TYPE http_requests_in_flight gauge']
+        for endpoint, count in sorted(in_flight.items()):
+            lines.append(f'http_requests_in_flight{_labels(endpoint=endpoint)} {count}')
+        return lines
+
+
+request_metrics = RequestMetrics()
+
+
+def _family(name, help_text, kind, samples):
+    """Lines for one metric family; samples are (labels dict, value)."""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    lines += [f'{name}{_labels(**labels) if labels else ""} {value}' for labels, value in samples]
+    return lines
+
+
+def render_metrics(engine):
+    """All metrics, as Prometheus text."""
+    from .cache import result_cache
+    from .db_pool import pool_status
+    from .passwords import password_hasher
+    from .query_stats import query_stats
+    from .reference_data import reference_cache
+    from .throttle import login_throttle
+    from .user_cache import user_cache
+
+    lines = request_metrics.render()
+
+    queries = [(endpoint, totals) for endpoints in query_stats.snapshot().values()
+               for endpoint, totals in endpoints.items()]
+    lines += _family('db_queries_total', 'SQL statements run by endpoint.', 'counter',
+                     [({'endpoint': endpoint}, totals['queries']) for endpoint, totals in queries])
+    lines += _family('db_query_seconds_total', 'Time spent in SQL statements by endpoint.', 'counter',
+                     [({'endpoint': endpoint}, totals['db_seconds']) for endpoint, totals in queries])
+
+    pool = pool_status(engine)
+    for key, help_text in (('size', 'Configured pool size.'),
+                           ('checked_out', 'Connections in use.'),
+                           ('idle', 'Connections idle in the pool.'),
+                           ('overflow', 'Overflow connections open.')):
+        if key in pool:
+            lines += _family(f'db_pool_{key}', help_text, 'gauge', [({}, pool[key])])
+    lines += _family('db_pool_checkouts_total', 'Connection checkouts.', 'counter', [({}, pool['checkouts'])])
+    lines += _family('db_pool_wait_seconds_total', 'Time spent waiting for a connection.', 'counter',
+                     [({}, pool['wait_seconds_total'])])
+    lines += _family('db_pool_timeouts_total', 'Checkouts that timed out.', 'counter', [({}, pool['timeouts'])])
+
+    caches = {'results': result_cache.local, 'users': user_cache, 'reference_data': reference_cache}
+    lines += _family('cache_hits_total', 'Cache hits.', 'counter',
+                     [({'cache': name}, cache.hits) for name, cache in caches.items()])
+    lines += _family('cache_misses_total', 'Cache misses.', 'counter',
+                     [({'cache': name}, cache.misses) for name, cache in caches.items()])
+    lines += _family('cache_hit_ratio', 'Share of lookups served from the cache.', 'gauge',
+                     [({'cache': name}, round(cache.hits / (cache.hits + cache.misses), 4)
+                       if cache.hits + cache.misses else 0) for name, cache in caches.items()])
+    lines += _family('cache_entries', 'Entries in the cache.', 'gauge',
+                     [({'cache': name}, len(cache)) for name, cache in caches.items()])
+
+    hasher = password_hasher.stats()
+    lines += _family('password_hash_pending', 'Hashes running or queued.', 'gauge', [({}, hasher['pending'])])
+    lines += _family('password_hash_rejected_total', 'Logins refused because hashing was saturated.', 'counter',
+                     [({}, hasher['rejected'])])
+
+    lines += _family('login_attempts_total', 'Login attempts by throttling outcome.', 'counter',
+                     [({'outcome': outcome}, count) for outcome, count in login_throttle.stats().items()])
+    return '\n'.join(lines) + '\n'
+
+
+def _start_timer():
+    g.metrics_endpoint = request.endpoint or 'unmatched'
+    g.metrics_started = time.perf_counter()
+    request_metrics.started(g.metrics_endpoint)
+
+
+def _remember_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _stop_timer(exc):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    status = 500 if exc is not None else g.pop('metrics_status', 500)
+    request_metrics.finished(g.metrics_endpoint, request.method, status, time.perf_counter() - started)
+
+
+def init_metrics(app):
+    """Time every request of this app."""
+    request_metrics.configure(app.config['METRICS_LATENCY_BUCKETS'])
+    app.before_request(_start_timer)
+    app.after_request(_remember_status)
+    app.teardown_request(_stop_timer)
@@ -1,31 +1,58 @@
-from datetime import datetime, timezone, date
-from sqlalchemy import func
-from app import db , login_manager
-from flask_bcrypt import Bcrypt
+from datetime import datetime, timedelta, timezone, date
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.exc import IntegrityError
+from app import db
 from flask_login import UserMixin
+from sqlalchemy.orm import aliased, joinedload
+from app.passwords import password_hasher
+from app.utils import decode_cursor, encode_cursor
 #from . import db, login_manager 
 
-bcrypt = Bcrypt() 
 class User(db.Model , UserMixin):
     __tablename__ = 'users' 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), nullable=False, unique=True)
     email = db.Column(db.String(120), nullable=False, unique=True)
     password_hash = db.Column(db.String(128), nullable=False)
+    # Bumped on every record/category write; part of every result cache key
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     #settings = db.relationship('Setting', back_populates='user')
     # Check if the provided password matches the stored hash
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
     
     # Method to set the password hash from a plain password
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
+
+    def password_needs_rehash(self):
+        """True when the stored hash uses an outdated bcrypt work factor."""
+        return password_hasher.needs_rehash(self.password_hash)
+
+    @staticmethod
+    def bump_data_version(user_id):
+        """Invalidate all cached results for a user; call in the same transaction as the write."""
+        db.session.execute(
+            User.__table__.update()
+            .where(User.__table__.c.id == user_id)
+            .values(data_version=User.__table__.c.data_version + 1)
+        )
+
+    @staticmethod
+    def get_data_version(user_id):
+        """Read the current data version straight from the database (never from a cached user)."""
+        return db.session.query(User.data_version).filter(User.id == user_id).scalar() or 0
 
 
 
 class Record(db.Model):
     __tablename__ = 'records'
+    __table_args__ = (
+        # Serves range scans and the keyset-paginated listing:
+        # WHERE username = ? AND date BETWEEN ? AND ? ORDER BY date DESC, id DESC
+        db.Index('ix_records_username_date_id', 'username', 'date', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)  # Foreign Key to Account model
@@ -33,6 +60,8 @@ class Record(db.Model):
     total_income = db.Column(db.Float, default=0.0)
     total_expense = db.Column(db.Float, default=0.0)
     date_range = db.Column(db.String(50), nullable=False)  # e.g., '2024-01', '2024-Q1'
+    date = db.Column(db.Date, nullable=False)  # Transaction date, parsed from date_range; used for all range queries
+    currency = db.Column(db.String(3), nullable=False, default='USD')  # Always the currency of the record's account
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))  # Foreign Key to Category model
     description = db.Column(db.String(255), nullable=True)  # Add description field
 
@@ -94,30 +123,134 @@ class Record(db.Model):
             'total_income': self.total_income,
             'total_expense': self.total_expense,
             'net_balance': self.net_balance,
-            'date_range': self.date_range
+            'date_range': self.date_range,
+            'date': self.date.isoformat(),
+            'currency': self.currency
         }
 
+    def contribution(self):
+        """Snapshot of what this record adds to the derived totals and rollup tables."""
+        return {
+            'account_id': self.account_id,
+            'category_id': self.category_id,
+            'day': self.date,
+            'currency': self.currency,
+            'income': self.total_income or 0.0,
+            'expense': self.total_expense or 0.0,
+        }
+
+    @staticmethod
+    def apply_contribution(user_id, contribution, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) a record's contribution from every derived
+        table. Must run in the same session transaction as the record write itself.
+        """
+        income = sign * contribution['income']
+        expense = sign * contribution['expense']
+        User.bump_data_version(user_id)
+        UserTotals.apply(user_id, contribution['account_id'], income, expense, sign)
+        DailyRollup.apply(user_id, contribution['day'], contribution['category_id'],
+                          contribution['currency'], income, expense, sign)
+        BudgetSpend.apply(user_id, {
+            (contribution['day'], contribution['category_id'], contribution['currency']): (income, expense, sign)
+        })
+
+    @staticmethod
+    def parse_date_range(value):
+        """
+        Turn a date_range string ('2024-01-31', '2024-01' or '2024-Q1') into the
+        date it starts on. Raises ValueError for anything else.
+        """
+        value = (value or '').strip()
+        try:
+            return datetime.strptime(value[:10], '%Y-%m-%d').date()
+        except ValueError:
+            pass
+        if value[4:6].upper() == '-Q':
+            year, quarter = int(value[:4]), int(value[6:])
+            if not 1 <= quarter <= 4:
+                raise ValueError(f"Invalid quarter in date range '{value}'.")
+            return date(year, (quarter - 1) * 3 + 1, 1)
+        return datetime.strptime(value, '%Y-%m').date()
+
     @staticmethod
     def get_by_user(username):
         """Retrieve a record for a specific username and date range."""
         return Record.query.filter_by(username=username)
 
     @staticmethod
-    def get_summary_by_user(username):
-        """Generate a summary for a specific user (aggregating income and expense)."""
-        result = db.session.query(
+    def get_page_by_user(username, cursor=None, limit=50, start_date=None, end_date=None,
+                         account_id=None, category_id=None, record_type=None):
+        """
+        Return one page of a user's records (newest first) and the cursor for the next page.
+
+        Pages are keyed on (date, id) instead of OFFSET, so every page is an
+        index range scan that costs the same no matter how deep the user pages.
+        """
+        query = Record.query.options(
+            joinedload(Record.account),
+            joinedload(Record.category)
+        ).filter(Record.username == username)
+
+        if start_date:
+            query = query.filter(Record.date >= start_date)
+        if end_date:
+            query = query.filter(Record.date <= end_date)
+        if account_id:
+            query = query.filter(Record.account_id == account_id)
+        if category_id:
+            query = query.filter(Record.category_id == category_id)
+        if record_type == 'income':
+            query = query.filter(Record.total_income > 0)
+        elif record_type == 'expense':
+            query = query.filter(Record.total_expense > 0)
+
+        if cursor:
+            last_date, last_id = decode_cursor(cursor)
+            last_date = date.fromisoformat(last_date)
+            query = query.filter(or_(
+                Record.date < last_date,
+                and_(Record.date == last_date, Record.id < int(last_id))
+            ))
+
+        # Fetch one extra row to know whether another page exists
+        records = query.order_by(Record.date.desc(), Record.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = encode_cursor(records[-1].date.isoformat(), records[-1].id)
+
+        return records, next_cursor
+
+    @staticmethod
+    def get_summary_by_user(username, start_date=None, end_date=None, currency=None):
+        """
+        Generate a summary for a specific user (aggregating income and expense), optionally
+        within a date range. Amounts are grouped by currency in SQL and converted to
+        `currency` (the user's display currency) in one pass.
+        """
+        from .fx import convert_sums
+
+        query = db.session.query(
+            Record.currency,
             func.sum(Record.total_income).label('total_income'),
             func.sum(Record.total_expense).label('total_expense')
-        ).filter_by(username=username).first()
+        ).filter(Record.username == username)
+        if start_date:
+            query = query.filter(Record.date >= start_date)
+        if end_date:
+            query = query.filter(Record.date <= end_date)
+        rows = query.group_by(Record.currency).all()
 
-        total_income = result.total_income if result.total_income else 0.0
-        total_expense = result.total_expense if result.total_expense else 0.0
+        total_income, total_expense = convert_sums(rows, currency)
         net_balance = total_income - total_expense  # Compute net balance dynamically
 
         return {
             'total_income': total_income,
             'total_expense': total_expense,
             'net_balance': net_balance,
+            'currency': currency,
         }
 
     @staticmethod
@@ -128,6 +261,249 @@ class Record(db.Model):
 
   
 
+class UserTotals(db.Model):
+    """
+    Running income/expense totals for each user, kept in step with every record
+    write so the summary page is a single primary-key lookup.
+    """
+    __tablename__ = 'user_totals'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_income = db.Column(db.Float, nullable=False, default=0.0)
+    total_expense = db.Column(db.Float, nullable=False, default=0.0)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def apply(user_id, account_id, income=0.0, expense=0.0, count=0):
+        """
+        Add deltas to the user's and the account's totals. Must be called in the
+        same session transaction as the record write it mirrors.
+        """
+        _increment_totals(UserTotals, {'user_id': user_id}, income, expense, count)
+        _increment_totals(AccountTotals, {'account_id': account_id, 'user_id': user_id}, income, expense, count)
+
+    @staticmethod
+    def get_summary(user_id, currency=None):
+        """
+        Return the same shape as Record.get_summary_by_user, read from the totals rows.
+        Unless some of the user's accounts are in another currency than `currency`
+        this is one primary-key lookup; otherwise the per-account totals are summed
+        per currency and converted.
+        """
+        from .fx import convert_sums
+
+        # The user's totals row, and whether any of their amounts are in another currency, in one lookup
+        foreign = exists().where(AccountTotals.user_id == user_id, AccountTotals.account_id == Account.id,
+                                 Account.currency != currency) if currency else db.false()
+        totals = db.session.query(UserTotals.total_income, UserTotals.total_expense, foreign) \
+            .filter(UserTotals.user_id == user_id).first()
+
+        if totals is None:
+            total_income = total_expense = 0.0
+        elif not totals[2]:
+            total_income, total_expense = totals[0], totals[1]
+        else:
+            rows = db.session.query(
+                Account.currency,
+                func.sum(AccountTotals.total_income),
+                func.sum(AccountTotals.total_expense)
+            ).join(Account, Account.id == AccountTotals.account_id) \
+             .filter(AccountTotals.user_id == user_id) \
+             .group_by(Account.currency).all()
+            total_income, total_expense = convert_sums(rows, currency)
+
+        return {
+            'total_income': total_income,
+            'total_expense': total_expense,
+            'net_balance': total_income - total_expense,
+            'currency': currency,
+        }
+
+    @staticmethod
+    def expected_account_totals():
+        """Subquery that recomputes per-account totals from the records table."""
+        return db.session.query(
+            Record.account_id.label('account_id'),
+            User.id.label('user_id'),
+            func.sum(Record.total_income).label('total_income'),
+            func.sum(Record.total_expense).label('total_expense'),
+            func.count(Record.id).label('record_count')
+        ).join(User, User.username == Record.username) \
+         .group_by(Record.account_id, User.id).subquery()
+
+    @staticmethod
+    def rebuild():
+        """Recompute every totals row from the records table in one transaction."""
+        expected = UserTotals.expected_account_totals()
+        try:
+            db.session.query(AccountTotals).delete()
+            db.session.query(UserTotals).delete()
+            db.session.execute(AccountTotals.__table__.insert().from_select(
+                ['account_id', 'user_id', 'total_income', 'total_expense', 'record_count'],
+                db.select(expected.c.account_id, expected.c.user_id,
+                          func.coalesce(expected.c.total_income, 0.0),
+                          func.coalesce(expected.c.total_expense, 0.0),
+                          expected.c.record_count)
+            ))
+            db.session.execute(UserTotals.__table__.insert().from_select(
+                ['user_id', 'total_income', 'total_expense', 'record_count'],
+                db.select(AccountTotals.user_id,
+                          func.sum(AccountTotals.total_income),
+                          func.sum(AccountTotals.total_expense),
+                          func.sum(AccountTotals.record_count))
+                .group_by(AccountTotals.user_id)
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def verify(tolerance=0.005):
+        """
+        Compare the stored per-account totals with a fresh aggregation of the
+        records table, and the per-user totals with the sum of their accounts.
+        Returns (kind, id, stored, expected) for every mismatch.
+        """
+        expected = UserTotals.expected_account_totals()
+        stored_income = func.coalesce(AccountTotals.total_income, 0.0)
+        stored_expense = func.coalesce(AccountTotals.total_expense, 0.0)
+        stored_count = func.coalesce(AccountTotals.record_count, 0)
+
+        missing_or_wrong = db.session.query(
+            expected.c.account_id, stored_income, stored_expense, stored_count,
+            expected.c.total_income, expected.c.total_expense, expected.c.record_count
+        ).outerjoin(AccountTotals, AccountTotals.account_id == expected.c.account_id).filter(or_(
+            func.abs(stored_income - func.coalesce(expected.c.total_income, 0.0)) > tolerance,
+            func.abs(stored_expense - func.coalesce(expected.c.total_expense, 0.0)) > tolerance,
+            stored_count != expected.c.record_count
+        ))
+
+        # Totals rows that no longer have any records behind them
+        orphaned = db.session.query(
+            AccountTotals.account_id, AccountTotals.total_income, AccountTotals.total_expense,
+            AccountTotals.record_count, db.literal(0.0), db.literal(0.0), db.literal(0)
+        ).outerjoin(expected, AccountTotals.account_id == expected.c.account_id) \
+         .filter(expected.c.account_id.is_(None), AccountTotals.record_count != 0)
+
+        mismatches = [
+            ('account', account_id, (income, expense, count), (exp_income or 0.0, exp_expense or 0.0, exp_count))
+            for account_id, income, expense, count, exp_income, exp_expense, exp_count
+            in missing_or_wrong.union_all(orphaned)
+        ]
+
+        by_account = db.session.query(
+            AccountTotals.user_id.label('user_id'),
+            func.sum(AccountTotals.total_income).label('total_income'),
+            func.sum(AccountTotals.total_expense).label('total_expense'),
+            func.sum(AccountTotals.record_count).label('record_count')
+        ).group_by(AccountTotals.user_id).subquery()
+
+        users_wrong = db.session.query(
+            by_account.c.user_id,
+            func.coalesce(UserTotals.total_income, 0.0), func.coalesce(UserTotals.total_expense, 0.0),
+            func.coalesce(UserTotals.record_count, 0),
+            by_account.c.total_income, by_account.c.total_expense, by_account.c.record_count
+        ).outerjoin(UserTotals, UserTotals.user_id == by_account.c.user_id).filter(or_(
+            func.abs(func.coalesce(UserTotals.total_income, 0.0) - by_account.c.total_income) > tolerance,
+            func.abs(func.coalesce(UserTotals.total_expense, 0.0) - by_account.c.total_expense) > tolerance,
+            func.coalesce(UserTotals.record_count, 0) != by_account.c.record_count
+        ))
+
+        mismatches += [
+            ('user', user_id, (income, expense, count), (exp_income, exp_expense, exp_count))
+            for user_id, income, expense, count, exp_income, exp_expense, exp_count in users_wrong
+        ]
+        return mismatches
+
+
+class AccountTotals(db.Model):
+    """Running income/expense totals for each account, maintained alongside UserTotals."""
+    __tablename__ = 'account_totals'
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    total_income = db.Column(db.Float, nullable=False, default=0.0)
+    total_expense = db.Column(db.Float, nullable=False, default=0.0)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+
+    account = db.relationship('Account')
+
+
+class DailyRollup(db.Model):
+    """
+    Per-user, per-category income/expense totals for each day. Weekly and monthly
+    series are derived from these rows, so charts over years of history read a few
+    hundred rollup rows instead of every record.
+    """
+    __tablename__ = 'daily_rollups'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    # 0 stands for "no category" so the column can be part of the primary key
+    category_id = db.Column(db.Integer, primary_key=True, default=0)
+    currency = db.Column(db.String(3), primary_key=True, default='USD')
+    total_income = db.Column(db.Float, nullable=False, default=0.0)
+    total_expense = db.Column(db.Float, nullable=False, default=0.0)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def apply(user_id, day, category_id, currency, income=0.0, expense=0.0, count=0):
+        """Add deltas to one day's rollup row for a user, category and currency."""
+        _increment_totals(
+            DailyRollup,
+            {'user_id': user_id, 'day': day, 'category_id': category_id or 0, 'currency': currency},
+            income, expense, count
+        )
+
+    @staticmethod
+    def rebuild(user_ids=None):
+        """
+        Recompute rollup rows from records, either for the given users or for everyone.
+        Runs in the caller's transaction; the caller commits.
+        """
+        rollups = db.session.query(DailyRollup)
+        source = db.select(
+            User.id,
+            Record.date,
+            func.coalesce(Record.category_id, 0),
+            Record.currency,
+            func.coalesce(func.sum(Record.total_income), 0.0),
+            func.coalesce(func.sum(Record.total_expense), 0.0),
+            func.count(Record.id)
+        ).join(User, User.username == Record.username)
+
+        if user_ids is not None:
+            rollups = rollups.filter(DailyRollup.user_id.in_(user_ids))
+            source = source.where(User.id.in_(user_ids))
+
+        rollups.delete(synchronize_session=False)
+        db.session.execute(DailyRollup.__table__.insert().from_select(
+            ['user_id', 'day', 'category_id', 'currency', 'total_income', 'total_expense', 'record_count'],
+            source.group_by(User.id, Record.date, func.coalesce(Record.category_id, 0), Record.currency)
+        ))
+
+
+def _increment_totals(model, key, income, expense, count):
+    """UPDATE ... SET col = col + delta for one totals row, inserting it the first time."""
+    table = model.__table__
+    increment = table.update() \
+        .where(*[table.c[name] == value for name, value in key.items()]) \
+        .values(
+            total_income=table.c.total_income + income,
+            total_expense=table.c.total_expense + expense,
+            record_count=table.c.record_count + count
+        )
+    if db.session.execute(increment).rowcount:
+        return
+
+    try:
+        # Savepoint so a concurrent first insert for the same key doesn't poison the outer transaction
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(
+                total_income=income, total_expense=expense, record_count=count, **key
+            ))
+    except IntegrityError:
+        db.session.execute(increment)
+
+
 class Analysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -146,62 +522,30 @@ class Analysis(db.Model):
         return {"income": income, "expenses": expenses}
 
     @staticmethod
-    def create_analysis(user_id, date_range):
-        """
-        Create a new analysis by aggregating income and expenses data
-        based on the given date range.
+    def create_analysis(user_id, date_range, start_date=None, end_date=None):
         """
-        # Set up income and expense data containers
-        income_data = {}
-        expense_data = {}
-
-        # Aggregating income and expenses by the selected date range (daily, weekly, monthly)
-        if date_range == 'daily':
-            # Aggregating daily income data
-            income_query = db.session.query(
-                Category.name,
-                func.sum(Category.amount).label('total_income')
-            ).filter(Category.user_id == user_id, Category.type == 'Income').group_by(Category.name).all()
-
-            # Aggregating daily expense data
-            expense_query = db.session.query(
-                Category.name,
-                func.sum(Category.amount).label('total_expense')
-            ).filter(Category.user_id == user_id, Category.type == 'Expense').group_by(Category.name).all()
-
-            # Store the results in the dictionaries
-            income_data = {name: total_income for name, total_income in income_query}
-            expense_data = {name: total_expense for name, total_expense in expense_query}
-
-        elif date_range == 'weekly':
-            # Aggregating weekly income and expense data
-            income_query = db.session.query(
-                func.date_trunc('week', Category.date).label('week_start'),
-                func.sum(Category.amount).label('total_income')
-            ).filter(Category.user_id == user_id, Category.type == 'Income').group_by(func.date_trunc('week', Category.date)).all()
+        Create a new analysis by aggregating the user's income and expense records
+        into buckets for the given granularity ('daily', 'weekly', 'monthly', 'quarterly').
 
-            expense_query = db.session.query(
-                func.date_trunc('week', Category.date).label('week_start'),
-                func.sum(Category.amount).label('total_expense')
-            ).filter(Category.user_id == user_id, Category.type == 'Expense').group_by(func.date_trunc('week', Category.date)).all()
-
-            income_data = {str(week_start): total_income for week_start, total_income in income_query}
-            expense_data = {str(week_start): total_expense for week_start, total_expense in expense_query}
+        While the user's data is unchanged, repeated calls with the same window
+        return the analysis row stored the first time instead of adding a new one.
+        """
+        from .aggregation import income_expense_series
+        from .cache import result_cache
 
-        elif date_range == 'monthly':
-            # Aggregating monthly income and expense data
-            income_query = db.session.query(
-                func.date_trunc('month', Category.date).label('month_start'),
-                func.sum(Category.amount).label('total_income')
-            ).filter(Category.user_id == user_id, Category.type == 'Income').group_by(func.date_trunc('month', Category.date)).all()
+        from .fx import current_rates
 
-            expense_query = db.session.query(
-                func.date_trunc('month', Category.date).label('month_start'),
-                func.sum(Category.amount).label('total_expense')
-            ).filter(Category.user_id == user_id, Category.type == 'Expense').group_by(func.date_trunc('month', Category.date)).all()
+        currency = Setting.get_currency(user_id)
+        rates_day = current_rates()[0]
+        version = User.get_data_version(user_id)
+        key = result_cache.make_key('analysis', user_id, version, date_range, start_date, end_date, currency, rates_day)
+        analysis_id = result_cache.get(key)
+        if analysis_id is not None:
+            analysis = db.session.get(Analysis, analysis_id)
+            if analysis is not None:
+                return analysis
 
-            income_data = {str(month_start): total_income for month_start, total_income in income_query}
-            expense_data = {str(month_start): total_expense for month_start, total_expense in expense_query}
+        income_data, expense_data = income_expense_series(user_id, date_range, start_date, end_date, currency)
 
         # Create the analysis record
         analysis = Analysis(
@@ -213,15 +557,27 @@ class Analysis(db.Model):
 
         db.session.add(analysis)
         db.session.commit()
+        result_cache.set(key, analysis.id)
         return analysis
     
 
 class Budget(db.Model):
+    """
+    A spending limit for one expense category, per calendar month, per week
+    (Monday to Sunday) or over a custom date range. What was spent in each
+    period is kept in budget_spend and updated with every record write.
+    """
+    PERIODS = ('monthly', 'weekly', 'custom')
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
+    period = db.Column(db.String(10), nullable=False, default='monthly', server_default='monthly')
+    start_date = db.Column(db.Date, nullable=True)  # custom periods only
+    end_date = db.Column(db.Date, nullable=True)  # custom periods only
+    currency = db.Column(db.String(3), nullable=False, default='USD', server_default='USD')  # currency of `amount`
 
     user = db.relationship('User', backref=db.backref('budgets', lazy=True))
     category = db.relationship('Category', backref=db.backref('budgets', lazy=True))
@@ -233,16 +589,279 @@ class Budget(db.Model):
         self.amount = new_amount
         db.session.commit()
 
+    @staticmethod
+    def period_bounds(period, day, start_date=None, end_date=None):
+        """(first, last) day of the budget period containing `day`, or None if `day` is outside a custom range."""
+        if period == 'monthly':
+            first = day.replace(day=1)
+            following = first.replace(year=first.year + 1, month=1) if first.month == 12 \
+                else first.replace(month=first.month + 1)
+            return first, following - timedelta(days=1)
+        if period == 'weekly':
+            first = day - timedelta(days=day.weekday())
+            return first, first + timedelta(days=6)
+        if start_date and end_date and start_date <= day <= end_date:
+            return start_date, end_date
+        return None
 
+    def current_period(self, today=None):
+        today = today or date.today()
+        if self.period == 'custom':
+            return self.start_date, self.end_date
+        return Budget.period_bounds(self.period, today)
 
+    @staticmethod
+    def rebuild_spend(budget_ids=None, user_ids=None):
+        """
+        Recompute budget_spend from the daily rollups for the given budgets, or
+        for every budget of the given users, with one INSERT ... SELECT over all
+        of them. Does not commit.
+        """
+        from .aggregation import bucket_expression
+
+        dialect_name = db.session.get_bind().dialect.name
+        budgets = db.select(Budget.id)
+        if budget_ids is not None:
+            budgets = budgets.where(Budget.id.in_(budget_ids))
+        if user_ids is not None:
+            budgets = budgets.where(Budget.user_id.in_(user_ids))
+
+        BudgetSpend.query.filter(BudgetSpend.budget_id.in_(budgets)).delete(synchronize_session=False)
+
+        # Each rollup day falls in one period of its budget: the calendar month or
+        # week containing it, or the custom range (days outside it are filtered out)
+        period_start = db.case(
+            (Budget.period == 'monthly', bucket_expression(DailyRollup.day, 'monthly', dialect_name)),
+            (Budget.period == 'weekly', bucket_expression(DailyRollup.day, 'weekly', dialect_name)),
+            else_=Budget.start_date
+        )
+        query = db.select(
+            Budget.id, period_start, DailyRollup.currency,
+            func.sum(DailyRollup.total_income), func.sum(DailyRollup.total_expense),
+            func.sum(DailyRollup.record_count)
+        ).join(DailyRollup, and_(DailyRollup.user_id == Budget.user_id,
+                                 DailyRollup.category_id == Budget.category_id)) \
+            .where(Budget.id.in_(budgets),
+                   or_(Budget.period != 'custom', DailyRollup.day.between(Budget.start_date, Budget.end_date))) \
+            .group_by(Budget.id, period_start, DailyRollup.currency) \
+            .having(func.sum(DailyRollup.record_count) > 0)
+
+        db.session.execute(BudgetSpend.__table__.insert().from_select(
+            ['budget_id', 'period_start', 'currency', 'total_income', 'total_expense', 'record_count'],
+            query
+        ))
+
+    @staticmethod
+    def current_spend_query(today, *columns):
+        """
+        Query for `columns` plus (currency, total_expense) of each budget's spend
+        in its current period; budgets with no spend yet get one row of NULLs.
+        """
+        month_start, _ = Budget.period_bounds('monthly', today)
+        week_start, _ = Budget.period_bounds('weekly', today)
+        current_start = db.case(
+            (Budget.period == 'monthly', month_start),
+            (Budget.period == 'weekly', week_start),
+            else_=Budget.start_date
+        )
+        return db.session.query(*columns, BudgetSpend.currency, BudgetSpend.total_expense) \
+            .select_from(Budget) \
+            .outerjoin(BudgetSpend, and_(BudgetSpend.budget_id == Budget.id,
+                                         BudgetSpend.period_start == current_start))
+
+    @staticmethod
+    def list_with_spend(user_id, today=None):
+        """
+        All of a user's budgets with what was spent in their current period, read
+        in one query. Returns dicts with budget, category, period_start,
+        period_end, spent, remaining and percent, in the budget's currency.
+        """
+        from .fx import conversion_factor, current_rates
+
+        today = today or date.today()
+        rows = Budget.current_spend_query(today, Budget, Category.name) \
+            .outerjoin(Category, Category.id == Budget.category_id) \
+            .filter(Budget.user_id == user_id) \
+            .order_by(Budget.id).all()
+
+        needs_rates = any(currency and currency != budget.currency for budget, _, currency, _ in rows)
+        rates = current_rates()[1] if needs_rates else {}
+
+        results = {}
+        for budget, category_name, currency, expense in rows:
+            period_start, period_end = budget.current_period(today)
+            result = results.setdefault(budget.id, {
+                'budget': budget,
+                'category': category_name,
+                'period_start': period_start,
+                'period_end': period_end,
+                'spent': 0.0,
+            })
+            if currency:
+                result['spent'] += (expense or 0.0) * conversion_factor(currency, budget.currency, rates)
+
+        for result in results.values():
+            amount = result['budget'].amount
+            result['remaining'] = amount - result['spent']
+            result['percent'] = result['spent'] / amount * 100 if amount else 0.0
+        return list(results.values())
+
+
+class BudgetSpend(db.Model):
+    """Income/expense recorded in a budget's category for one period, per currency."""
+    __tablename__ = 'budget_spend'
+    budget_id = db.Column(db.Integer, db.ForeignKey('budget.id'), primary_key=True)
+    period_start = db.Column(db.Date, primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    total_income = db.Column(db.Float, nullable=False, default=0.0)
+    total_expense = db.Column(db.Float, nullable=False, default=0.0)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def apply(user_id, deltas):
+        """
+        Add rollup-shaped deltas {(day, category_id, currency): (income, expense, count)}
+        to the spend of every budget they fall into. One budget query per call.
+        """
+        category_ids = {category_id for _, category_id, _ in deltas if category_id}
+        if not category_ids:
+            return
+        budgets = db.session.query(Budget.id, Budget.category_id, Budget.period, Budget.start_date, Budget.end_date) \
+            .filter(Budget.user_id == user_id, Budget.category_id.in_(category_ids)).all()
+        if not budgets:
+            return
+
+        by_period = {}
+        for (day, category_id, currency), (income, expense, count) in deltas.items():
+            if day is None:
+                continue
+            for budget_id, budget_category_id, period, start_date, end_date in budgets:
+                if budget_category_id != category_id:
+                    continue
+                bounds = Budget.period_bounds(period, day, start_date, end_date)
+                if bounds is None:
+                    continue
+                key = (budget_id, bounds[0], currency)
+                total_income, total_expense, total_count = by_period.get(key, (0.0, 0.0, 0))
+                by_period[key] = (total_income + income, total_expense + expense, total_count + count)
+
+        for (budget_id, period_start, currency), (income, expense, count) in by_period.items():
+            _increment_totals(
+                BudgetSpend,
+                {'budget_id': budget_id, 'period_start': period_start, 'currency': currency},
+                income, expense, count
+            )
+
+
+class BudgetAlert(db.Model):
+    """
+    A budget passing 50, 80 or 100% of its amount in one period. The primary key
+    makes recording a crossing idempotent: evaluating again never duplicates it.
+    """
+    __tablename__ = 'budget_alerts'
+    THRESHOLDS = (50, 80, 100)
+
+    budget_id = db.Column(db.Integer, db.ForeignKey('budget.id'), primary_key=True)
+    period_start = db.Column(db.Date, primary_key=True)
+    threshold = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    spent = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    def to_dict(self):
+        return {
+            'budget_id': self.budget_id,
+            'period_start': self.period_start.isoformat(),
+            'threshold': self.threshold,
+            'spent': self.spent,
+            'amount': self.amount,
+            'currency': self.currency,
+            'created_at': self.created_at.isoformat(),
+        }
+
+    @staticmethod
+    def active_budgets(today):
+        """SQL condition for budgets whose current period includes today."""
+        return or_(
+            Budget.period != 'custom',
+            and_(Budget.start_date <= today, Budget.end_date >= today)
+        )
+
+    @staticmethod
+    def evaluate_chunk(after_id, limit, rates, today=None):
+        """
+        Evaluate the next `limit` active budgets with id > after_id and record any
+        new threshold crossings. Four statements per chunk whatever its size.
+        Returns (last budget id or None when done, budgets evaluated, alerts recorded).
+        Does not commit.
+        """
+        from .fx import conversion_factor
+
+        today = today or date.today()
+        budget_ids = [budget_id for budget_id, in db.session.query(Budget.id)
+                      .filter(Budget.id > after_id, BudgetAlert.active_budgets(today))
+                      .order_by(Budget.id).limit(limit)]
+        if not budget_ids:
+            return None, 0, 0
+        first_id, last_id = budget_ids[0], budget_ids[-1]
+
+        rows = Budget.current_spend_query(
+            today, Budget.id, Budget.user_id, Budget.amount, Budget.currency, Budget.period, Budget.start_date
+        ).filter(Budget.id.between(first_id, last_id), BudgetAlert.active_budgets(today)).all()
+
+        budgets = {}
+        for budget_id, user_id, amount, budget_currency, period, start_date, currency, expense in rows:
+            period_start = start_date if period == 'custom' else Budget.period_bounds(period, today)[0]
+            budget = budgets.setdefault(budget_id, {
+                'user_id': user_id, 'amount': amount, 'currency': budget_currency,
+                'period_start': period_start, 'spent': 0.0,
+            })
+            if currency:
+                budget['spent'] += (expense or 0.0) * conversion_factor(currency, budget_currency, rates)
+
+        period_starts = {budget['period_start'] for budget in budgets.values()}
+        recorded = set(
+            db.session.query(BudgetAlert.budget_id, BudgetAlert.period_start, BudgetAlert.threshold)
+            .filter(BudgetAlert.budget_id.between(first_id, last_id),
+                    BudgetAlert.period_start.in_(period_starts))
+            .all()
+        )
+
+        alerts = []
+        for budget_id, budget in budgets.items():
+            if not budget['amount'] or budget['amount'] <= 0:
+                continue
+            percent = budget['spent'] / budget['amount'] * 100
+            for threshold in BudgetAlert.THRESHOLDS:
+                if percent >= threshold and (budget_id, budget['period_start'], threshold) not in recorded:
+                    alerts.append({
+                        'budget_id': budget_id,
+                        'period_start': budget['period_start'],
+                        'threshold': threshold,
+                        'user_id': budget['user_id'],
+                        'spent': budget['spent'],
+                        'amount': budget['amount'],
+                        'currency': budget['currency'],
+                        'created_at': datetime.now(timezone.utc).replace(tzinfo=None),
+                    })
+        if alerts:
+            db.session.execute(BudgetAlert.__table__.insert().values(alerts))
+        return last_id, len(budgets), len(alerts)
 
 
 class Account(db.Model):
     __tablename__ = 'accounts'
+    __table_args__ = (
+        # A user's accounts, and the "does this user have a <type> account" check of the backfill
+        db.Index('ix_accounts_user_id_account_type', 'user_id', 'account_type'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     account_type = db.Column(db.String(100), nullable=False)  # e.g., 'Cash', 'Savings', 'Credit Card'
     balance = db.Column(db.Float, default=0.0)
+    currency = db.Column(db.String(3), nullable=False, default='USD')  # Currency of the balance and of every record in it
 
     user = db.relationship('User', backref=db.backref('accounts', lazy=True))
 
@@ -254,56 +873,210 @@ class Account(db.Model):
         db.session.commit()
 
 
+    DEFAULT_TYPES = ['Cash', 'Card (Visa)', 'Savings']
+
     @staticmethod
-    def create_default_accounts(user_id):
-        """Create default accounts for a user."""
-        default_accounts = ['Cash', 'Card (Visa)', 'Savings']
-        for account_type in default_accounts:
-            if not Account.query.filter_by(user_id=user_id, account_type=account_type).first():
-                new_account = Account(
-                    user_id=user_id,
-                    account_type=account_type,
-                    balance=0.0
-                )
-                db.session.add(new_account)
+    def default_rows(user_id, currency='USD'):
+        return [
+            {'user_id': user_id, 'account_type': account_type, 'balance': 0.0, 'currency': currency}
+            for account_type in Account.DEFAULT_TYPES
+        ]
+
+    @staticmethod
+    def create_default_accounts(user_id, currency='USD'):
+        """Create whichever default accounts a user is missing, in one insert."""
+        existing = {
+            account_type for account_type, in db.session.query(Account.account_type)
+            .filter(Account.user_id == user_id, Account.account_type.in_(Account.DEFAULT_TYPES))
+        }
+        rows = [row for row in Account.default_rows(user_id, currency) if row['account_type'] not in existing]
+        if rows:
+            db.session.execute(Account.__table__.insert().values(rows))
         db.session.commit()
 
 
 class Category(db.Model):
+    """
+    A record category. Rows with no user_id are the default categories shared by
+    every user. Users never change those rows: renaming or deleting a default
+    creates the user's own copy (default_id points at the default it replaces),
+    which hides the shared row for that user only.
+    """
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # NULL for shared defaults
     name = db.Column(db.String(100), nullable=False)  # e.g., 'Salary', 'Education'
     type = db.Column(db.String(50), nullable=False)  # e.g., 'Income', 'Expense'
     amount = db.Column(db.Numeric(10,2), nullable=False, default=0)     # The amount for each income/expense
-    date = db.Column(db.Date, nullable=False)        # The date of income/expense
+    date = db.Column(db.Date, nullable=False, default=date.today)        # The date of income/expense
+    default_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True, index=True)
+    hidden = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
    
     user = db.relationship('User', backref=db.backref('categories', lazy=True))
 
-    @staticmethod
-    def create_default_categories(user_id):
-        default_income = ['Awards', 'Coupons', 'Grants', 'Lottery', 'Refunds', 'Rental', 'Salary', 'Sale']
-        default_expense = ['Beauty', 'Baby', 'Car Bills', 'Clothing', 'Education', 'Electronics',
-                           'Health', 'Food', 'Entertainment', 'Home', 'Shopping', 'Social', 
-                           'Sport', 'Tax', 'Telephone', 'Transportation']
+    DEFAULT_INCOME = ['Awards', 'Coupons', 'Grants', 'Lottery', 'Refunds', 'Rental', 'Salary', 'Sale']
+    DEFAULT_EXPENSE = ['Beauty', 'Baby', 'Car Bills', 'Clothing', 'Education', 'Electronics',
+                       'Health', 'Food', 'Entertainment', 'Home', 'Shopping', 'Social',
+                       'Sport', 'Tax', 'Telephone', 'Transportation']
 
-        categories = [
-            Category(user_id=user_id, name=name, type='Income') for name in default_income
-        ] + [
-            Category(user_id=user_id, name=name, type='Expense') for name in default_expense
+    @staticmethod
+    def default_rows(on_date=None):
+        on_date = on_date or date.today()
+        return [
+            {'user_id': None, 'name': name, 'type': category_type, 'amount': 0, 'date': on_date}
+            for category_type, names in (('Income', Category.DEFAULT_INCOME), ('Expense', Category.DEFAULT_EXPENSE))
+            for name in names
         ]
 
-        db.session.bulk_save_objects(categories)
+    @staticmethod
+    def create_default_categories():
+        """Create whichever shared default categories are missing. Safe to call repeatedly."""
+        existing = set(
+            db.session.query(Category.name, Category.type).filter(Category.user_id.is_(None)).all()
+        )
+        rows = [row for row in Category.default_rows() if (row['name'], row['type']) not in existing]
+        if rows:
+            db.session.execute(Category.__table__.insert().values(rows))
+            # Every user sees the shared defaults, so every user's cached categories are stale
+            db.session.execute(User.__table__.update().values(data_version=User.__table__.c.data_version + 1))
         db.session.commit()
 
+    @staticmethod
+    def visible_to(user_id):
+        """SQL condition for the categories a user sees: their own plus the defaults they haven't replaced."""
+        override = aliased(Category)
+        replaced = exists().where(override.user_id == user_id, override.default_id == Category.id)
+        return and_(
+            Category.hidden.is_(False),
+            or_(Category.user_id == user_id, and_(Category.user_id.is_(None), ~replaced))
+        )
+
+    @staticmethod
+    def override_default(user_id, default, name=None, hidden=False):
+        """
+        Give a user their own copy of a shared default category and move their
+        records, budgets and rollups over to it. Does not commit.
+        """
+        copy = Category(
+            user_id=user_id,
+            name=name or default.name,
+            type=default.type,
+            default_id=default.id,
+            hidden=hidden
+        )
+        db.session.add(copy)
+        db.session.flush()
+
+        username = db.session.query(User.username).filter(User.id == user_id).scalar_subquery()
+        db.session.execute(
+            Record.__table__.update()
+            .where(Record.__table__.c.username == username, Record.__table__.c.category_id == default.id)
+            .values(category_id=copy.id)
+        )
+        db.session.execute(
+            Budget.__table__.update()
+            .where(Budget.__table__.c.user_id == user_id, Budget.__table__.c.category_id == default.id)
+            .values(category_id=copy.id)
+        )
+        db.session.execute(
+            DailyRollup.__table__.update()
+            .where(DailyRollup.__table__.c.user_id == user_id, DailyRollup.__table__.c.category_id == default.id)
+            .values(category_id=copy.id)
+        )
+        return copy
+
+
+class Job(db.Model):
+    """
+    A unit of background work (analysis, import, export) queued in the database
+    and executed by `flask run-worker` processes.
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers poll for the oldest runnable job
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    kind = db.Column(db.String(50), nullable=False)  # e.g., 'analysis', 'import', 'export'
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    payload = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    run_after = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    user = db.relationship('User', backref=db.backref('jobs', lazy=True))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'attempts': self.attempts,
+            # Server-side file paths stay private
+            'result': {key: value for key, value in self.result.items() if key != 'path'}
+                      if isinstance(self.result, dict) else self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class FxRate(db.Model):
+    """Daily exchange rates, stored as units of `currency` per 1 USD."""
+    __tablename__ = 'fx_rates'
+    day = db.Column(db.Date, primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
+
+    @staticmethod
+    def store(rates, day=None):
+        """Replace the stored rates for a day (today by default) with `rates`."""
+        day = day or date.today()
+        try:
+            FxRate.query.filter_by(day=day).delete()
+            db.session.execute(FxRate.__table__.insert(), [
+                {'day': day, 'currency': currency, 'rate': rate} for currency, rate in rates.items()
+            ])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def latest_day(on_date=None):
+        query = db.session.query(func.max(FxRate.day))
+        if on_date:
+            query = query.filter(FxRate.day <= on_date)
+        return query.scalar()
+
+    @staticmethod
+    def rates_for(day):
+        """All stored rates for one day as {currency: rate}."""
+        return dict(db.session.query(FxRate.currency, FxRate.rate).filter(FxRate.day == day).all())
+
 
 class Setting(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     currency = db.Column(db.String(3), nullable=False, default='USD')
 
     user = db.relationship('User', backref='user_settings' , overlaps="settings")
 
-
-@login_manager.user_loader
-def load_user(user_id):
-   return User.query.get(int(user_id))
\ No newline at end of file
+    @staticmethod
+    def get_currency(user_id):
+        """The user's display currency."""
+        return db.session.query(Setting.currency).filter_by(user_id=user_id).scalar() or 'USD'
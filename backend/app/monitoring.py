@@ -0,0 +1,48 @@
+"""Operational endpoints: metrics, pool status and query statistics.
+
+They require the MONITORING_TOKEN bearer token and answer 404 when it is
+not configured.
+"""
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+
+from . import db
+from .db_pool import pool_status
+from .metrics import render_metrics
+from .query_stats import query_stats
+
+monitoring_bp = Blueprint('monitoring', __name__, url_prefix='/monitoring')
+
+
+@monitoring_bp.before_request
+def check_token():
+    token = current_app.config.get('MONITORING_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        abort(401)
+
+
+@monitoring_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Request latency, status and in-flight metrics plus pool and cache gauges, for Prometheus to scrape.
+    """
+    return Response(render_metrics(db.engine), mimetype='text/plain; version=0.0.4')
+
+
+@monitoring_bp.route('/pool', methods=['GET'])
+def pool():
+    """
+    Checked-out and idle connections, overflow in use, and how long checkouts waited.
+    """
+    return jsonify(pool_status(db.engine))
+
+
+@monitoring_bp.route('/queries', methods=['GET'])
+def queries():
+    """
+    Query counts, database time and slowest statements per endpoint, grouped by blueprint.
+    """
+    return jsonify(query_stats.snapshot())
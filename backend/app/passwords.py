@@ -0,0 +1,111 @@
+"""Password hashing on a bounded bcrypt thread pool.
+
+At most PASSWORD_HASH_WORKERS hashes run at once and PASSWORD_HASH_MAX_QUEUE
+wait; beyond that, or past PASSWORD_HASH_TIMEOUT, callers get HasherBusy.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from . import bcrypt
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are queued, or one didn't finish within the timeout."""
+
+
+TIMEOUT_MESSAGES = {
+    'hash': "Setting the password took too long, please try again.",
+    'check': "Checking the password took too long, please try again.",
+}
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool and keeps latency/queue metrics."""
+
+    def __init__(self, rounds=12, workers=None, max_queue=64, timeout=30.0):
+        self._executor = None
+        self.configure(rounds, workers, max_queue, timeout)
+
+    def configure(self, rounds=12, workers=None, max_queue=64, timeout=30.0):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self._lock = threading.Lock()
+        self.pending = 0  # submitted and not finished (queued + running)
+        self.max_pending = 0
+        self.rejected = 0
+        self.calls = {'hash': 0, 'check': 0}
+        self.seconds = {'hash': 0.0, 'check': 0.0}  # total time from submit to result
+        self.max_seconds = {'hash': 0.0, 'check': 0.0}
+
+    def _run(self, kind, func, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HasherBusy("Too many logins in progress, please try again.")
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        started = time.perf_counter()
+        # Counted as pending until the hash actually finishes, even if this request stops waiting for it
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._finished)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()  # drops it if it's still queued
+            raise HasherBusy(TIMEOUT_MESSAGES[kind])
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.calls[kind] += 1
+                self.seconds[kind] += elapsed
+                self.max_seconds[kind] = max(self.max_seconds[kind], elapsed)
+
+    def _finished(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def hash(self, password):
+        return self._run('hash', bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def check(self, password_hash, password):
+        return self._run('check', bcrypt.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when the hash was made with a different work factor than the configured one."""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': self.pending,
+                'max_pending': self.max_pending,
+                'rejected': self.rejected,
+                **{f'{kind}_calls': count for kind, count in self.calls.items()},
+                **{f'{kind}_avg_ms': self.seconds[kind] / count * 1000 if count else 0.0
+                   for kind, count in self.calls.items()},
+                **{f'{kind}_max_ms': seconds * 1000 for kind, seconds in self.max_seconds.items()},
+            }
+
+
+password_hasher = PasswordHasher()
+
+
+def init_passwords(app):
+    """Size the hashing pool from the app config."""
+    password_hasher.configure(
+        app.config['BCRYPT_LOG_ROUNDS'],
+        app.config['PASSWORD_HASH_WORKERS'],
+        app.config['PASSWORD_HASH_MAX_QUEUE'],
+        app.config['PASSWORD_HASH_TIMEOUT']
+    )
@@ -0,0 +1,121 @@
+"""Default accounts and settings for new and existing users.
+
+provision_user() creates a user and their defaults in one transaction;
+backfill_defaults() adds missing defaults to existing users in chunks and
+is safe to rerun.
+"""
+from sqlalchemy import exists, func, literal, or_, select, union_all
+from sqlalchemy.exc import IntegrityError
+
+from .models import Account, Setting, User, db
+
+
+def default_rows(user_id, currency='USD'):
+    """The rows every new user starts with, as {table: [row, ...]}."""
+    return {
+        Account.__table__: Account.default_rows(user_id, currency),
+        Setting.__table__: [{'user_id': user_id, 'currency': currency}],
+    }
+
+
+def insert_defaults(user_id, currency='USD'):
+    """Insert a user's default rows into the current transaction (no commit)."""
+    for table, rows in default_rows(user_id, currency).items():
+        db.session.execute(table.insert().values(rows))
+
+
+def provision_user(username, email, password=None, currency='USD', password_hash=None):
+    """
+    Create a user with all their defaults in one transaction and return it.
+    Raises ValueError if the username or email is already taken.
+    """
+    taken = db.session.query(User.username, User.email) \
+        .filter(or_(User.username == username, User.email == email)).first()
+    if taken:
+        raise ValueError('Username already taken' if taken.username == username else 'Email already registered')
+
+    user = User(username=username, email=email)
+    if password_hash:
+        user.password_hash = password_hash
+    else:
+        user.set_password(password)
+
+    try:
+        db.session.add(user)
+        db.session.flush()  # assigns user.id
+        insert_defaults(user.id, currency)
+        db.session.commit()
+    except IntegrityError:
+        # Someone registered the same username or email in the meantime
+        db.session.rollback()
+        raise ValueError('Username or email already registered')
+    except Exception as e:
+        db.session.rollback()
+        raise e
+    return user
+
+
+def backfill_defaults_chunk(after_id, limit, settings=True, accounts=True):
+    """
+    Give the next `limit` users with id > after_id whichever default settings
+    and/or accounts they are missing. One statement per table whatever the
+    chunk size. Returns (last user id or None when done, users checked,
+    settings added, accounts added). Does not commit.
+    """
+    user_ids = [user_id for user_id, in db.session.query(User.id)
+                .filter(User.id > after_id).order_by(User.id).limit(limit)]
+    if not user_ids:
+        return None, 0, 0, 0
+    in_chunk = User.id.between(user_ids[0], user_ids[-1])
+    settings_added = accounts_added = 0
+
+    # Settings first: default accounts are created in the user's currency
+    if settings:
+        settings_added = db.session.execute(Setting.__table__.insert().from_select(
+            ['user_id', 'currency'],
+            select(User.id, literal('USD')).where(in_chunk, ~exists().where(Setting.user_id == User.id))
+        )).rowcount
+
+    if accounts:
+        account_types = union_all(*(select(literal(account_type).label('account_type'))
+                                    for account_type in Account.DEFAULT_TYPES)).subquery()
+        currency = select(func.min(Setting.currency)).where(Setting.user_id == User.id).scalar_subquery()
+        accounts_added = db.session.execute(Account.__table__.insert().from_select(
+            ['user_id', 'account_type', 'balance', 'currency'],
+            select(User.id, account_types.c.account_type, literal(0.0), func.coalesce(currency, 'USD'))
+            .select_from(User).join(account_types, literal(True))
+            .where(in_chunk, ~exists().where(Account.user_id == User.id,
+                                             Account.account_type == account_types.c.account_type))
+        )).rowcount
+        if accounts_added:
+            # Cached account lists of this chunk are keyed on the old data versions
+            db.session.execute(User.__table__.update().where(in_chunk)
+                               .values(data_version=User.__table__.c.data_version + 1))
+    return user_ids[-1], len(user_ids), settings_added, accounts_added
+
+
+def backfill_defaults(chunk_size=10000, report=None, settings=True, accounts=True):
+    """
+    Backfill missing default settings and/or accounts for every user,
+    committing each chunk. `report(users, settings_added, accounts_added,
+    last_id)` is called after every chunk with running totals. Returns those
+    totals.
+    """
+    last_id = 0
+    users = settings_added = accounts_added = 0
+    while True:
+        try:
+            next_id, checked, settings_count, accounts_count = \
+                backfill_defaults_chunk(last_id, chunk_size, settings, accounts)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if next_id is None:
+            return users, settings_added, accounts_added
+        users += checked
+        settings_added += settings_count
+        accounts_added += accounts_count
+        last_id = next_id
+        if report:
+            report(users, settings_added, accounts_added, last_id)
@@ -0,0 +1,155 @@
+"""Per-request SQL statistics.
+
+Statements are timed with engine events and folded into per-endpoint totals
+for GET /monitoring/queries; slow ones are logged. SQL_DETECT_REPEATS warns
+about N+1 patterns and SQL_QUERY_HEADERS adds X-Query-Count / X-DB-Time.
+"""
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RepeatedQueryError(Exception):
+    """Raised for N+1 query patterns when SQL_RAISE_ON_REPEAT is set."""
+
+
+class RequestQueries:
+    """The statements one request ran."""
+
+    def __init__(self, keep_slowest=5):
+        self.keep_slowest = keep_slowest
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []  # (seconds, statement), slowest first
+        self.statements = Counter()
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        if len(self.slowest) < self.keep_slowest or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.keep_slowest:]
+
+    def repeated(self, threshold):
+        return [(statement, times) for statement, times in self.statements.most_common() if times >= threshold]
+
+
+class QueryStats:
+    """Query counts and database time per endpoint, for this process."""
+
+    def __init__(self, keep_slowest=5):
+        self.keep_slowest = keep_slowest
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, queries):
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'db_seconds': 0.0, 'max_queries': 0, 'slowest': [],
+            })
+            entry['requests'] += 1
+            entry['queries'] += queries.count
+            entry['db_seconds'] += queries.seconds
+            entry['max_queries'] = max(entry['max_queries'], queries.count)
+            slowest = entry['slowest'] + queries.slowest
+            slowest.sort(key=lambda item: item[0], reverse=True)
+            entry['slowest'] = slowest[:self.keep_slowest]
+
+    def snapshot(self):
+        """{blueprint: {endpoint: totals}}, with per-request averages."""
+        report = {}
+        with self._lock:
+            for endpoint, entry in self._endpoints.items():
+                blueprint = endpoint.rpartition('.')[0] or 'app'
+                report.setdefault(blueprint, {})[endpoint] = {
+                    'requests': entry['requests'],
+                    'queries': entry['queries'],
+                    'db_seconds': round(entry['db_seconds'], 6),
+                    'avg_queries': round(entry['queries'] / entry['requests'], 2),
+                    'avg_db_ms': round(entry['db_seconds'] * 1000 / entry['requests'], 3),
+                    'max_queries': entry['max_queries'],
+                    'slowest': [{'ms': round(seconds * 1000, 3), 'statement': statement}
+                                for seconds, statement in entry['slowest']],
+                }
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+query_stats = QueryStats()
+
+
+def _one_line(statement, limit=500):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    if not has_app_context():
+        return
+
+    config = current_app.config
+    if seconds >= config['SQL_SLOW_QUERY']:
+        current_app.logger.warning("Slow query (%.3fs)%s: %s", seconds,
+                                   f" in {request.endpoint}" if has_request_context() else "",
+                                   _one_line(statement))
+    if has_request_context():
+        queries = g.get('sql_queries')
+        if queries is None:
+            queries = g.sql_queries = RequestQueries(config['SQL_SLOWEST_KEPT'])
+        queries.add(_one_line(statement), seconds)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _drop_timer(context):
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def detect_repeats_enabled(app):
+    return app.config['SQL_DETECT_REPEATS'] or app.testing
+
+
+def _finish_request(response):
+    queries = g.pop('sql_queries', None) or RequestQueries()
+    if request.endpoint is None:
+        return response
+    query_stats.record(request.endpoint, queries)
+
+    app = current_app._get_current_object()
+    if app.config['SQL_QUERY_HEADERS']:
+        response.headers['X-Query-Count'] = str(queries.count)
+        response.headers['X-DB-Time'] = f"{queries.seconds * 1000:.1f}ms"
+    if detect_repeats_enabled(app):
+        repeated = queries.repeated(app.config['SQL_REPEAT_THRESHOLD'])
+        if repeated:
+            details = '; '.join(f"{times}x {statement}" for statement, times in repeated)
+            app.logger.warning("Repeated queries in %s (possible N+1): %s", request.endpoint, details)
+            if app.config['SQL_RAISE_ON_REPEAT']:
+                raise RepeatedQueryError(f"{request.endpoint}: {details}")
+    return response
+
+
+def init_query_stats(app):
+    """Collect per-request query statistics for this app."""
+    query_stats.keep_slowest = app.config['SQL_SLOWEST_KEPT']
+    app.after_request(_finish_request)
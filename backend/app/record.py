@@ -5,21 +5,33 @@
     #Supporting CRUD (Create, Read, Update, Delete) operations if required.
 from datetime import date, datetime, timedelta  
 from sqlalchemy.orm import joinedload
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, Response, render_template, request, flash, redirect, stream_with_context, url_for
 from flask_login import login_required, current_user
-from .models import Account, Analysis, Category, db, Record
+from .aggregation import income_expense_series
+from .cache import result_cache
+from .exporter import gzip_stream, iter_export_rows, stream_csv, stream_json
+from .importer import import_records, open_statement
+from .jobs import enqueue, spool_upload
+from .fx import current_rates
+from .reference_data import get_reference_data
+from .models import Account, AccountTotals, Category, db, Record, User, UserTotals
 
 record_bp = Blueprint('record', __name__, url_prefix='/record')
 
+
+def parse_date_arg(value):
+    """Parse an optional YYYY-MM-DD query argument into a date."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
 @record_bp.route('/add', methods=['GET', 'POST'])
 @login_required
 def add_record():
     try:
-        # Fetch user-specific accounts and categories
-        accounts = Account.query.filter_by(user_id=current_user.id).all()
-        income_categories = Category.query.filter_by(user_id=current_user.id, type='income').all()
-        expense_categories = Category.query.filter_by(user_id=current_user.id, type='expense').all()
-
         if request.method == 'POST':
             record_id = request.form.get('record_id')
             record_type = request.form.get('type')  # 'income' or 'expense'
@@ -28,6 +40,18 @@ def add_record():
             amount = float(request.form.get('amount', 0.0))
             description = request.form.get('description', '')
             date_range = request.form.get('date_range', datetime.now().strftime('%Y-%m-%d'))
+            record_date = Record.parse_date_range(date_range)
+
+            # Checked against the database: the reference data cache is per process
+            # and may not have seen an account or category created on another worker.
+            # Records are always in their account's currency
+            account = Account.query.filter_by(id=account_id, user_id=current_user.id).first()
+            if not account:
+                flash("Account not found!", 'danger')
+                return redirect(url_for('record.add_record'))
+            if not Category.query.filter(Category.id == category_id, Category.visible_to(current_user.id)).first():
+                flash("Category not found!", 'danger')
+                return redirect(url_for('record.add_record'))
 
             if record_id:  # Update existing record
                 record = Record.query.filter_by(id=record_id, username=current_user.username).first()
@@ -35,6 +59,9 @@ def add_record():
                     flash("Record not found!", 'danger')
                     return redirect(url_for('record.add_record'))
 
+                # Remember what the record contributed to the totals and rollups before changing it
+                old_contribution = record.contribution()
+
                 # Handle type change (income <-> expense)
                 if record_type == 'income':
                     record.total_expense = 0.0  # Clear expense value
@@ -48,15 +75,21 @@ def add_record():
                 record.account_id = account_id
                 record.description = description
                 record.date_range = date_range
+                record.date = record_date
+                record.currency = account.currency
                 
                
                 
                   # Validate the record
                 try:
                     Record.validate_record(record)
+                    # Move the record's contribution in the derived tables in the same transaction
+                    Record.apply_contribution(current_user.id, old_contribution, sign=-1)
+                    Record.apply_contribution(current_user.id, record.contribution())
                     db.session.commit()
                     flash('Record updated successfully!', 'success')
                 except ValueError as e:
+                    db.session.rollback()
                     flash(str(e), 'danger')
                     return redirect(url_for('record.add_record'))
                 
@@ -71,8 +104,11 @@ def add_record():
                     total_expense=amount if record_type == 'expense' else 0.0,
                     description=description,
                     date_range=date_range,
+                    date=record_date,
+                    currency=account.currency,
                 )
                 db.session.add(new_record)
+                Record.apply_contribution(current_user.id, new_record.contribution())
                 db.session.commit()
                 flash('Record added successfully!', 'success')
                 return redirect(url_for('record.get_records'))
@@ -83,11 +119,14 @@ def add_record():
         if record_id:
             record = Record.query.filter_by(id=record_id, username=current_user.username).first()
 
+        # Fetch user-specific accounts and categories
+        reference = get_reference_data(current_user.id)
+
         return render_template(
             'add_record.html',
-            accounts=accounts,
-            income_categories=income_categories,
-            expense_categories=expense_categories,
+            accounts=reference.accounts,
+            income_categories=reference.income_categories,
+            expense_categories=reference.expense_categories,
             record=record,
             datetime = datetime
         )
@@ -98,6 +137,99 @@ def add_record():
 
 
 
+@record_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_statement():
+    """
+    Import records from an uploaded CSV or OFX bank statement.
+    """
+    accounts = get_reference_data(current_user.id).accounts
+
+    if request.method == 'POST':
+        statement = request.files.get('statement')
+        if not statement or not statement.filename:
+            flash("Please choose a statement file to import.", 'warning')
+            return redirect(url_for('record.import_statement'))
+
+        file_format = request.form.get('format') or (
+            'ofx' if statement.filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
+        )
+        default_account_id = request.form.get('account_id', type=int)
+
+        if request.form.get('background'):
+            # Large statements are imported by the job workers. Chunks are committed
+            # as they go, so a failed import is not retried (it would duplicate rows).
+            job = enqueue(current_user.id, 'import', {
+                'path': spool_upload(statement),
+                'format': file_format,
+                'default_account_id': default_account_id,
+            }, max_attempts=1)
+            flash(f"Import queued as job {job.id}.", 'success')
+            return redirect(url_for('jobs.job_status', job_id=job.id))
+
+        try:
+            result = import_records(
+                current_user,
+                open_statement(statement.stream, file_format),
+                default_account_id=default_account_id
+            )
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('record.import_statement'))
+
+        flash(f"Imported {result.imported} records ({result.rows_per_sec:.0f} rows/sec), "
+              f"{result.failed} failed.", 'success' if not result.failed else 'warning')
+        return render_template('import_records.html', accounts=accounts, result=result)
+
+    return render_template('import_records.html', accounts=accounts, result=None)
+
+
+@record_bp.route('/export', methods=['GET'])
+@login_required
+def export_records():
+    """
+    Stream the user's records as CSV or JSON, optionally gzip-compressed.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'json'):
+        flash("Export format must be 'csv' or 'json'.", 'warning')
+        return redirect(url_for('record.get_records'))
+
+    compress = request.args.get('gzip') in ('1', 'true', 'yes')
+
+    try:
+        start_date = parse_date_arg(request.args.get('start_date'))
+        end_date = parse_date_arg(request.args.get('end_date'))
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('record.get_records'))
+
+    if request.args.get('background'):
+        # Written to a file by the job workers; download from /jobs/<id>/download when done
+        job = enqueue(current_user.id, 'export', {
+            'format': export_format,
+            'gzip': compress,
+            'start_date': start_date.isoformat() if start_date else None,
+            'end_date': end_date.isoformat() if end_date else None,
+        })
+        return redirect(url_for('jobs.job_status', job_id=job.id))
+
+    rows = iter_export_rows(current_user.username, start_date=start_date, end_date=end_date)
+    chunks = stream_csv(rows) if export_format == 'csv' else stream_json(rows)
+    if compress:
+        chunks = gzip_stream(chunks)
+
+    filename = f"records-{current_user.username}.{export_format}" + ('.gz' if compress else '')
+    mimetype = 'application/gzip' if compress else ('text/csv' if export_format == 'csv' else 'application/json')
+
+    # stream_with_context keeps the app/db context alive while the generator runs
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
 @record_bp.route('/update/<int:record_id>', methods=['GET', 'POST'])
 @login_required
 def update_record(record_id):
@@ -135,7 +267,8 @@ def delete_record(record_id):
             flash("You are not authorized to delete this record.", "danger")
             return redirect(url_for('record.get_records'))
         
-        # Delete the record
+        # Delete the record and take it out of the totals and rollups
+        Record.apply_contribution(current_user.id, record.contribution(), sign=-1)
         db.session.delete(record)
         db.session.commit()
         
@@ -153,15 +286,35 @@ def get_record_summary():
     try:
         username = current_user.username  # Use current logged-in user's username
 
-        # Retrieve the summary for the user
-        summary = Record.get_summary_by_user(username)
+        # Retrieve the summary for the user, optionally limited to a date range
+        start_date = request.args.get('start_date') or None
+        end_date = request.args.get('end_date') or None
+        currency = current_user.currency
+        if start_date or end_date:
+            summary = Record.get_summary_by_user(
+                username,
+                start_date=parse_date_arg(start_date),
+                end_date=parse_date_arg(end_date),
+                currency=currency
+            )
+        else:
+            # All-time totals come from the incrementally maintained totals rows
+            summary = UserTotals.get_summary(current_user.id, currency)
 
         # If no summary is found, you can provide a default message
         if not summary:
             flash("No summary available for this user.", "warning")
             return redirect(url_for('dashboard_routes.dashboard'))
 
-        return render_template('record_summary.html', summary=summary)
+        if start_date or end_date:
+            summary['date_range'] = f"{start_date or 'beginning'} to {end_date or 'today'}"
+        else:
+            summary['date_range'] = 'All time'
+
+        account_totals = AccountTotals.query.options(joinedload(AccountTotals.account)) \
+            .filter_by(user_id=current_user.id).all()
+
+        return render_template('record_summary.html', summary=summary, account_totals=account_totals)
 
     except Exception as e:
         flash(f"Error retrieving record summary: {str(e)}", 'danger')
@@ -176,14 +329,40 @@ def get_record_summary():
 def get_records():
      
     try:
-        # Fetch the user's records with account and category data
-        records = Record.query.options(
-            joinedload(Record.account),   # Load the related account
-            joinedload(Record.category)    # Load the related category
-        ).filter_by(username=current_user.username).all()
+        # Page size is capped so a single request can never pull the whole history
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        filters = {
+            'start_date': request.args.get('start_date') or None,
+            'end_date': request.args.get('end_date') or None,
+            'account_id': request.args.get('account_id', type=int),
+            'category_id': request.args.get('category_id', type=int),
+            'record_type': request.args.get('type') or None,
+        }
+
+        records, next_cursor = Record.get_page_by_user(
+            current_user.username,
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            **dict(filters, start_date=parse_date_arg(filters['start_date']),
+                   end_date=parse_date_arg(filters['end_date']))
+        )
+
+        # Filter dropdowns
+        reference = get_reference_data(current_user.id)
 
-        return render_template('record_detail.html', records=records)
+        return render_template(
+            'record_detail.html',
+            records=records,
+            next_cursor=next_cursor,
+            limit=limit,
+            filters=filters,
+            accounts=reference.accounts,
+            categories=reference.categories
+        )
 
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('record.get_records'))
     except Exception as e:
         flash(f"Error fetching records: {str(e)}", 'danger')
         return redirect(url_for('dashboard_routes.dashboard'))
@@ -196,23 +375,37 @@ def get_overview():
     """
     try:
         # Parse the date range from the request (or use defaults)
-        start_date = request.args.get('start_date', (date.today() - timedelta(days=30)).strftime('%Y-%m-%d'))
-        end_date = request.args.get('end_date', date.today().strftime('%Y-%m-%d'))
-
-        # Fetch and aggregate income and expense data
-        data = Analysis.get_income_expense_by_date_range(current_user.id, start_date, end_date)
-
-        # Generate charts for different intervals
-        analysis = Analysis(user_id=current_user.id, income_data=data['income'], expense_data=data['expenses'])
-        daily_data = analysis.generate_chart('daily')
-        weekly_data = analysis.generate_chart('weekly')
-        monthly_data = analysis.generate_chart('monthly')
+        start_date = parse_date_arg(request.args.get('start_date')) or date.today() - timedelta(days=30)
+        end_date = parse_date_arg(request.args.get('end_date')) or date.today()
+
+        # One aggregation query per interval, income and expense together, in the
+        # user's display currency; cached until the next record/category write
+        currency = current_user.currency
+
+        def build_charts():
+            charts = {}
+            for interval in ('daily', 'weekly', 'monthly'):
+                income, expense = income_expense_series(current_user.id, interval, start_date, end_date, currency)
+                charts[interval] = {
+                    'labels': list(income.keys()),
+                    'income': list(income.values()),
+                    'expense': list(expense.values()),
+                }
+            return charts
+
+        charts = result_cache.get_or_compute(
+            'overview', current_user.id, User.get_data_version(current_user.id),
+            (start_date, end_date, currency, current_rates()[0]), build_charts
+        )
 
         return render_template(
             'overview.html',
-            daily_data=daily_data,
-            weekly_data=weekly_data,
-            monthly_data=monthly_data,
+            daily_data=charts['daily'],
+            weekly_data=charts['weekly'],
+            monthly_data=charts['monthly'],
+            start_date=start_date,
+            end_date=end_date,
+            currency=currency
         )
     except Exception as e:
         flash(f"Error fetching overview: {str(e)}", 'danger')
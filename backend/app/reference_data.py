@@ -0,0 +1,80 @@
+"""Per-user accounts and categories for rendering form pages.
+
+Loaded with one query and kept in an in-process LRU keyed on the user's
+data_version, which every account and category write bumps in the database,
+so no worker serves a list from before a write. Routes that store an id
+still validate it against the database, not this cache.
+"""
+from collections import namedtuple
+
+from sqlalchemy import literal, select, union_all
+
+from .cache import LRUCache
+from .models import Account, Category, User, db
+
+AccountRef = namedtuple('AccountRef', 'id account_type balance currency')
+CategoryRef = namedtuple('CategoryRef', 'id name type')
+
+
+class ReferenceData:
+    """A user's accounts and categories, as read-only tuples."""
+
+    def __init__(self, accounts, categories):
+        self.accounts = accounts
+        self.categories = categories
+
+    def categories_of_type(self, category_type):
+        category_type = category_type.lower()
+        return [category for category in self.categories if category.type.lower() == category_type]
+
+    @property
+    def income_categories(self):
+        return self.categories_of_type('income')
+
+    @property
+    def expense_categories(self):
+        return self.categories_of_type('expense')
+
+    def account(self, account_id):
+        return next((account for account in self.accounts if account.id == account_id), None)
+
+
+reference_cache = LRUCache(max_entries=4096, ttl=300)
+
+
+def load_reference_data(user_id):
+    """Read a user's accounts and categories in a single query."""
+    # Both selects share one column layout: the last two columns are
+    # balance/currency for accounts and 0/type for categories
+    accounts = select(
+        literal('account').label('kind'), Account.id, Account.account_type.label('name'),
+        Account.balance.label('amount'), Account.currency.label('extra')
+    ).where(Account.user_id == user_id)
+    categories = select(
+        literal('category'), Category.id, Category.name, literal(0.0), Category.type
+    ).where(Category.visible_to(user_id))
+
+    account_refs, category_refs = [], []
+    for kind, item_id, name, amount, extra in db.session.execute(union_all(accounts, categories).order_by('kind', 'id')):
+        if kind == 'account':
+            account_refs.append(AccountRef(item_id, name, amount, extra))
+        else:
+            category_refs.append(CategoryRef(item_id, name, extra))
+    return ReferenceData(account_refs, category_refs)
+
+
+def get_reference_data(user_id):
+    # Entries of older versions are never looked up again and age out of the LRU
+    key = (user_id, User.get_data_version(user_id))
+    data = reference_cache.get(key)
+    if data is None:
+        data = load_reference_data(user_id)
+        reference_cache.set(key, data)
+    return data
+
+
+def init_reference_data(app):
+    """Size the reference data cache from the app config."""
+    reference_cache.max_entries = app.config['REFERENCE_CACHE_MAX_ENTRIES']
+    reference_cache.ttl = app.config['REFERENCE_CACHE_TTL']
+    reference_cache.clear()
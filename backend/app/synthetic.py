@@ -0,0 +1,269 @@
+"""Synthetic production-scale data for `flask generate-data`.
+
+Users are generated in batches by worker processes with multi-row inserts;
+output is deterministic for a given --seed and --prefix.
+"""
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import Account, Budget, Category, DailyRollup, Record, User, UserTotals, db
+from .provisioning import default_rows
+
+EXTRA_ACCOUNT_TYPES = ['Checking', 'Card (Mastercard)', 'Brokerage', 'Wallet', 'Joint']
+CUSTOM_CATEGORY_NAMES = ['Pets', 'Travel', 'Gifts', 'Coffee', 'Subscriptions', 'Hobbies', 'Charity', 'Freelance']
+DESCRIPTIONS = [None, None, None, 'Groceries', 'Monthly bill', 'Online order', 'Dinner', 'Fuel', 'Transfer']
+
+_worker_app = None
+
+
+def records_for_user(rng, settings):
+    """How many records one user gets under the configured distribution."""
+    mean = settings['records_per_user']
+    distribution = settings['records_distribution']
+    if distribution == 'fixed':
+        return mean
+    if distribution == 'uniform':
+        return rng.randint(0, 2 * mean)
+    # lognormal: most users have a few records, a long tail has very many
+    sigma = 1.0
+    return int(rng.lognormvariate(math.log(max(mean, 1)) - sigma ** 2 / 2, sigma))
+
+
+def record_day(rng, settings):
+    offset = rng.random()
+    if settings['date_distribution'] == 'recent':
+        offset **= 2  # denser towards today
+    return settings['today'] - timedelta(days=int(offset * settings['days']))
+
+
+def category_weights(count, skew):
+    """Zipf-like weights, so a few categories (like Food) get most records."""
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def insert_and_fetch_ids(table, rows, key_column, keys):
+    """Multi-row insert, then read the new ids back as {key: id}."""
+    db.session.execute(table.insert(), rows)
+    return dict(db.session.execute(
+        db.select(getattr(table.c, key_column), table.c.id).where(getattr(table.c, key_column).in_(keys))
+    ).all())
+
+
+def generate_batch(settings, first, count):
+    """Generate users first..first+count-1 with everything they own. Returns (users, records)."""
+    rng = random.Random(settings['seed'] * 1000003 + first)
+    usernames = [f"{settings['prefix']}-{index}" for index in range(first, first + count)]
+    user_ids = insert_and_fetch_ids(User.__table__, [
+        {'username': username, 'email': f"{username}@example.com",
+         'password_hash': settings['password_hash'], 'data_version': 0}
+        for username in usernames
+    ], 'username', usernames)
+    user_currency = {user_id: rng.choice(settings['currencies']) for user_id in user_ids.values()}
+
+    # Default accounts and settings, as at registration, plus some extra accounts
+    rows = {}
+    for user_id, currency in user_currency.items():
+        for table, table_rows in default_rows(user_id, currency).items():
+            rows.setdefault(table, []).extend(table_rows)
+        extra = rng.randint(0, settings['extra_accounts'])
+        rows[Account.__table__].extend(
+            {'user_id': user_id, 'account_type': account_type, 'balance': 0.0, 'currency': currency}
+            for account_type in rng.sample(EXTRA_ACCOUNT_TYPES, min(extra, len(EXTRA_ACCOUNT_TYPES)))
+        )
+    for account in rows[Account.__table__]:
+        account['balance'] = round(rng.uniform(0, 5000), 2)
+    for table, table_rows in rows.items():
+        db.session.execute(table.insert(), table_rows)
+    accounts = {}
+    for account_id, user_id in db.session.execute(
+            db.select(Account.id, Account.user_id).where(Account.user_id.in_(user_currency))):
+        accounts.setdefault(user_id, []).append(account_id)
+
+    # Custom categories on top of the shared defaults
+    custom_rows = []
+    for user_id in user_currency:
+        for name in rng.sample(CUSTOM_CATEGORY_NAMES, min(settings['custom_categories'], len(CUSTOM_CATEGORY_NAMES))):
+            custom_rows.append({'user_id': user_id, 'name': name, 'amount': 0, 'date': settings['today'],
+                                'type': 'Income' if name == 'Freelance' else 'Expense', 'hidden': False})
+    if custom_rows:
+        db.session.execute(Category.__table__.insert(), custom_rows)
+    categories = {user_id: {'Income': list(settings['shared']['Income']), 'Expense': list(settings['shared']['Expense'])}
+                  for user_id in user_currency}
+    for category_id, user_id, category_type in db.session.execute(
+            db.select(Category.id, Category.user_id, Category.type).where(Category.user_id.in_(user_currency))):
+        categories[user_id][category_type].append(category_id)
+    db.session.commit()
+
+    # Budgets on the categories each user spends most on
+    budget_rows = []
+    for user_id, currency in user_currency.items():
+        for category_id in categories[user_id]['Expense'][:settings['budgets_per_user']]:
+            period = rng.choice(('monthly', 'monthly', 'weekly'))
+            budget_rows.append({
+                'user_id': user_id, 'category_id': category_id, 'period': period, 'currency': currency,
+                'name': f"{period.capitalize()} budget", 'start_date': None, 'end_date': None,
+                'amount': round(settings['amount_median'] * (20 if period == 'monthly' else 5) * rng.uniform(0.5, 1.5)),
+            })
+    if budget_rows:
+        db.session.execute(Budget.__table__.insert(), budget_rows)
+        db.session.commit()
+
+    # Records, streamed in chunks
+    username_of = {user_id: username for username, user_id in user_ids.items()}
+    chunk, records = [], 0
+    mu = math.log(settings['amount_median'])
+    for user_id, currency in user_currency.items():
+        user_categories = categories[user_id]
+        weights = {kind: category_weights(len(ids), settings['category_skew']) for kind, ids in user_categories.items()}
+        for _ in range(records_for_user(rng, settings)):
+            is_income = rng.random() < settings['income_share']
+            kind = 'Income' if is_income else 'Expense'
+            # Income is rarer but larger
+            amount = round(rng.lognormvariate(mu + (2 if is_income else 0), settings['amount_spread']), 2)
+            day = record_day(rng, settings)
+            chunk.append({
+                'account_id': rng.choice(accounts[user_id]),
+                'username': username_of[user_id],
+                'total_income': amount if is_income else 0.0,
+                'total_expense': 0.0 if is_income else amount,
+                'date_range': day.isoformat(),
+                'date': day,
+                'currency': currency,
+                'category_id': rng.choices(user_categories[kind], weights[kind])[0],
+                'description': rng.choice(DESCRIPTIONS),
+            })
+            if len(chunk) >= settings['chunk_size']:
+                db.session.execute(Record.__table__.insert(), chunk)
+                db.session.commit()
+                records += len(chunk)
+                chunk = []
+    if chunk:
+        db.session.execute(Record.__table__.insert(), chunk)
+        records += len(chunk)
+
+    # Derived data for these users; totals are rebuilt once by the caller
+    DailyRollup.rebuild(list(user_currency))
+    Budget.rebuild_spend(user_ids=list(user_currency))
+    db.session.commit()
+    return len(user_currency), records
+
+
+def _init_worker():
+    global _worker_app
+    from . import create_app
+    _worker_app = create_app()
+
+
+def _run_batch(settings, first, count):
+    with _worker_app.app_context():
+        try:
+            return generate_batch(settings, first, count)
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+@click.command('generate-data')
+@click.option('--users', default=100, show_default=True, help='Users to create.')
+@click.option('--records-per-user', default=1000, show_default=True, help='Mean records per user.')
+@click.option('--records-distribution', type=click.Choice(['lognormal', 'uniform', 'fixed']), default='lognormal',
+              show_default=True, help='How record counts vary between users.')
+@click.option('--days', default=730, show_default=True, help='History length in days.')
+@click.option('--date-distribution', type=click.Choice(['uniform', 'recent']), default='recent', show_default=True,
+              help='Spread records evenly or more densely towards today.')
+@click.option('--income-share', default=0.1, show_default=True, help='Fraction of records that are income.')
+@click.option('--amount-median', default=25.0, show_default=True, help='Median expense amount.')
+@click.option('--amount-spread', default=1.0, show_default=True, help='Lognormal sigma of amounts.')
+@click.option('--category-skew', default=1.0, show_default=True, help='Zipf exponent for category popularity.')
+@click.option('--extra-accounts', default=2, show_default=True, help='Up to this many accounts besides the defaults.')
+@click.option('--custom-categories', default=2, show_default=True, help='Custom categories per user.')
+@click.option('--budgets-per-user', default=3, show_default=True, help='Budgets per user.')
+@click.option('--currencies', default='USD', show_default=True, help='Comma-separated; each user gets one.')
+@click.option('--workers', type=int, help='Worker processes (default: CPU count, 1 for SQLite).')
+@click.option('--batch-users', default=50, show_default=True, help='Users per worker task.')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per INSERT statement and commit.')
+@click.option('--prefix', default=None, help='Username prefix (default: synthetic-<timestamp>).')
+@click.option('--seed', default=1, show_default=True)
+@with_appcontext
+def generate_data_command(users, records_per_user, records_distribution, days, date_distribution, income_share,
+                          amount_median, amount_spread, category_skew, extra_accounts, custom_categories,
+                          budgets_per_user, currencies, workers, batch_users, chunk_size, prefix, seed):
+    """Generate users, accounts, categories, budgets and records for load testing."""
+    sqlite = current_app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    if workers is None:
+        workers = 1 if sqlite else (os.cpu_count() or 1)
+    elif workers > 1 and sqlite:
+        click.echo("SQLite allows one writer at a time; extra workers will mostly wait on its lock.", err=True)
+
+    Category.create_default_categories()
+    shared = {'Income': [], 'Expense': []}
+    # Defaults in list order, so the first ones get the most records under --category-skew
+    for category_id, category_type in db.session.query(Category.id, Category.type) \
+            .filter(Category.user_id.is_(None)).order_by(Category.id):
+        shared[category_type].append(category_id)
+    food = db.session.query(Category.id).filter(Category.user_id.is_(None), Category.name == 'Food').scalar()
+    if food in shared['Expense']:
+        shared['Expense'].insert(0, shared['Expense'].pop(shared['Expense'].index(food)))
+
+    template = User()
+    template.set_password('synthetic')  # hashed once; every generated user shares it
+    settings = {
+        'prefix': prefix or f"synthetic-{int(time.time())}",
+        'seed': seed,
+        'today': date.today(),
+        'password_hash': template.password_hash,
+        'shared': shared,
+        'records_per_user': records_per_user,
+        'records_distribution': records_distribution,
+        'days': days,
+        'date_distribution': date_distribution,
+        'income_share': income_share,
+        'amount_median': amount_median,
+        'amount_spread': amount_spread,
+        'category_skew': category_skew,
+        'extra_accounts': extra_accounts,
+        'custom_categories': custom_categories,
+        'budgets_per_user': budgets_per_user,
+        'currencies': [code.strip().upper() for code in currencies.split(',')],
+        'chunk_size': chunk_size,
+    }
+    batches = [(first, min(batch_users, users - first)) for first in range(0, users, batch_users)]
+
+    started = time.perf_counter()
+    done_users = done_records = 0
+
+    def report(batch_users_done, batch_records):
+        nonlocal done_users, done_records
+        done_users += batch_users_done
+        done_records += batch_records
+        elapsed = time.perf_counter() - started
+        click.echo(f"{done_users}/{users} users, {done_records} records, {done_records / elapsed:.0f} records/sec")
+
+    if workers == 1:
+        for first, count in batches:
+            try:
+                report(*generate_batch(settings, first, count))
+            except Exception:
+                db.session.rollback()
+                raise
+    else:
+        # Fresh interpreters, so no worker inherits the parent's connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as executor:
+            futures = [executor.submit(_run_batch, settings, first, count) for first, count in batches]
+            for future in as_completed(futures):
+                report(*future.result())
+
+    click.echo("Rebuilding totals...")
+    UserTotals.rebuild()
+    elapsed = time.perf_counter() - started
+    click.echo(f"Done: {done_users} users ({settings['prefix']}-*), {done_records} records in {elapsed:.1f}s.")
@@ -0,0 +1,133 @@
+"""Login throttling with token buckets per username and per client address.
+
+Buckets are in process memory, or in Redis when THROTTLE_REDIS_URL (or
+CACHE_REDIS_URL) is set so the limits hold across workers.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from .cache import redis
+
+
+class LocalBuckets:
+    """Token buckets in an in-process LRU (idle buckets are full anyway, so evicting them is harmless)."""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_per_second):
+        """Take one token. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / refill_per_second
+
+
+class RedisBuckets:
+    """Token buckets shared by all processes, updated atomically by a Lua script."""
+
+    SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix='expense-tracker:throttle:'):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+        self.fallback = LocalBuckets()
+
+    def take(self, key, capacity, refill_per_second):
+        try:
+            allowed, tokens = self._script(keys=[self.prefix + key], args=[capacity, refill_per_second, time.time()])
+        except redis.RedisError:
+            # Keep limiting per process rather than failing open
+            return self.fallback.take(key, capacity, refill_per_second)
+        tokens = float(tokens)
+        return bool(allowed), 0.0 if allowed else (1 - tokens) / refill_per_second
+
+
+class LoginThrottle:
+    """Per-username and per-address token-bucket limits for login attempts."""
+
+    def __init__(self, backend=None, username_burst=5, username_per_minute=5, address_burst=20,
+                 address_per_minute=20):
+        self.configure(backend, username_burst, username_per_minute, address_burst, address_per_minute)
+
+    def configure(self, backend=None, username_burst=5, username_per_minute=5, address_burst=20,
+                  address_per_minute=20):
+        self.backend = backend or LocalBuckets()
+        self.limits = {
+            'username': (username_burst, username_per_minute / 60.0),
+            'address': (address_burst, address_per_minute / 60.0),
+        }
+        self._lock = threading.Lock()
+        self.counters = {'allowed': 0, 'rejected_username': 0, 'rejected_address': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def check(self, username, address):
+        """
+        Take a token for this attempt. Returns 0 if the attempt may go ahead,
+        otherwise the number of seconds the client should wait.
+        """
+        for kind, value in (('address', address or 'unknown'), ('username', (username or '').strip().lower())):
+            capacity, rate = self.limits[kind]
+            allowed, retry_after = self.backend.take(f"{kind}:{value}", capacity, rate)
+            if not allowed:
+                self._count(f'rejected_{kind}')
+                return max(1, math.ceil(retry_after))
+        self._count('allowed')
+        return 0
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+login_throttle = LoginThrottle()
+
+
+def init_throttle(app):
+    """Configure login limits from the app config."""
+    backend = None
+    url = app.config.get('THROTTLE_REDIS_URL') or app.config.get('CACHE_REDIS_URL')
+    if url:
+        if redis is None:
+            app.logger.warning("A Redis URL is set but the 'redis' package is not installed; "
+                               "login throttling is per process.")
+        else:
+            backend = RedisBuckets(url)
+    login_throttle.configure(
+        backend,
+        app.config['LOGIN_USERNAME_BURST'],
+        app.config['LOGIN_USERNAME_PER_MINUTE'],
+        app.config['LOGIN_ADDRESS_BURST'],
+        app.config['LOGIN_ADDRESS_PER_MINUTE']
+    )
@@ -0,0 +1,83 @@
+"""Cached user loader for Flask-Login.
+
+Returns a read-only snapshot of the user from an in-process LRU instead of
+querying users on every request. Entries are dropped when a change to the
+user or their Setting commits, and expire after USER_CACHE_TTL elsewhere.
+"""
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db, login_manager
+from .cache import LRUCache
+from .models import Setting, User
+
+user_cache = LRUCache(max_entries=4096, ttl=60)
+
+
+class CachedUser(UserMixin):
+    """What request handlers see as current_user. Load the User row for writes."""
+
+    def __init__(self, id, username, email, currency):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.currency = currency or 'USD'
+
+    def __repr__(self):
+        return f"<CachedUser {self.id} {self.username}>"
+
+
+def fetch_user(user_id):
+    """Build a user snapshot with one query (users joined to their setting)."""
+    row = db.session.query(User.id, User.username, User.email, Setting.currency) \
+        .outerjoin(Setting, Setting.user_id == User.id) \
+        .filter(User.id == user_id).first()
+    return CachedUser(*row) if row else None
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    user = user_cache.get(user_id)
+    if user is None:
+        user = fetch_user(user_id)
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id):
+    user_cache.delete(user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_user_ids', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User):
+            changed.add(instance.id)
+        elif isinstance(instance, Setting):
+            changed.add(instance.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    # Only after commit, so a concurrent request can't re-cache the old values
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
+
+def init_user_cache(app):
+    """Size the user cache from the app config."""
+    user_cache.max_entries = app.config['USER_CACHE_MAX_ENTRIES']
+    user_cache.ttl = app.config['USER_CACHE_TTL']
+    user_cache.clear()
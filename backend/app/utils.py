@@ -1,14 +1,23 @@
-import requests
+import base64
+
+from app.currency import currency_cache
+
 
 def fetch_currencies():
-    url = 'https://v6.exchangerate-api.com/v6/ab97bd5614750d4db0b80557/latest/USD'
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        data = response.json()
-        if data['result'] == 'success':
-            return list(data['conversion_rates'].keys())  # Extract currency codes
-        else:
-            return []  # Return an empty list if there's an error
-    else:
-        return []  # Return an empty list if the request fails
+    """Return the list of known currency codes, served from the currency cache."""
+    return sorted(currency_cache.get_rates().keys())
+
+
+def encode_cursor(*values):
+    """Pack the sort key of the last row on a page into an opaque, URL-safe cursor."""
+    raw = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a cursor made by encode_cursor back into its list of string values."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid page cursor.")
@@ -0,0 +1,26 @@
+"""Add data_version to users for result cache invalidation
+
+Revision ID: 1b5d7e93af40
+Revises: f0a6c3d85e17
+Create Date: 2026-10-18 14:32:10.846379
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b5d7e93af40'
+down_revision = 'f0a6c3d85e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,97 @@
+"""Add currency to accounts, records and daily_rollups; add fx_rates table
+
+Revision ID: 6a4e1c2f9d07
+Revises: 3d92a1f6b8c4
+Create Date: 2026-10-18 16:42:09.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a4e1c2f9d07'
+down_revision = '3d92a1f6b8c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('accounts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), nullable=False, server_default='USD'))
+
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), nullable=False, server_default='USD'))
+
+    # Existing accounts were kept in the owner's preferred currency, and records in their account's
+    op.execute("""
+        UPDATE accounts SET currency = (
+            SELECT MAX(setting.currency) FROM setting WHERE setting.user_id = accounts.user_id
+        )
+        WHERE EXISTS (SELECT 1 FROM setting WHERE setting.user_id = accounts.user_id)
+    """)
+    op.execute("""
+        UPDATE records SET currency = (
+            SELECT accounts.currency FROM accounts WHERE accounts.id = records.account_id
+        )
+        WHERE records.account_id IS NOT NULL
+    """)
+
+    op.create_table('fx_rates',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('rate', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'currency')
+    )
+
+    # The currency becomes part of the rollup key, so rebuild the table from records
+    op.drop_table('daily_rollups')
+    op.create_table('daily_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('total_income', sa.Float(), nullable=False),
+    sa.Column('total_expense', sa.Float(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'category_id', 'currency')
+    )
+    op.execute("""
+        INSERT INTO daily_rollups (user_id, day, category_id, currency, total_income, total_expense, record_count)
+        SELECT u.id, r.date, COALESCE(r.category_id, 0), r.currency,
+               COALESCE(SUM(r.total_income), 0), COALESCE(SUM(r.total_expense), 0), COUNT(r.id)
+        FROM records r JOIN users u ON u.username = r.username
+        WHERE r.date IS NOT NULL
+        GROUP BY u.id, r.date, COALESCE(r.category_id, 0), r.currency
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_rollups')
+    op.create_table('daily_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('total_income', sa.Float(), nullable=False),
+    sa.Column('total_expense', sa.Float(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'category_id')
+    )
+    op.execute("""
+        INSERT INTO daily_rollups (user_id, day, category_id, total_income, total_expense, record_count)
+        SELECT u.id, r.date, COALESCE(r.category_id, 0),
+               COALESCE(SUM(r.total_income), 0), COALESCE(SUM(r.total_expense), 0), COUNT(r.id)
+        FROM records r JOIN users u ON u.username = r.username
+        WHERE r.date IS NOT NULL
+        GROUP BY u.id, r.date, COALESCE(r.category_id, 0)
+    """)
+
+    op.drop_table('fx_rates')
+
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.drop_column('currency')
+
+    with op.batch_alter_table('accounts', schema=None) as batch_op:
+        batch_op.drop_column('currency')
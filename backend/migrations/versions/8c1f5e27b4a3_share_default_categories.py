@@ -0,0 +1,148 @@
+"""Share default categories between users instead of copying them per user
+
+Revision ID: 8c1f5e27b4a3
+Revises: 6a4e1c2f9d07
+Create Date: 2026-10-18 17:31:52.804116
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1f5e27b4a3'
+down_revision = '6a4e1c2f9d07'
+branch_labels = None
+depends_on = None
+
+DEFAULT_INCOME = ['Awards', 'Coupons', 'Grants', 'Lottery', 'Refunds', 'Rental', 'Salary', 'Sale']
+DEFAULT_EXPENSE = ['Beauty', 'Baby', 'Car Bills', 'Clothing', 'Education', 'Electronics',
+                   'Health', 'Food', 'Entertainment', 'Home', 'Shopping', 'Social',
+                   'Sport', 'Tax', 'Telephone', 'Transportation']
+DEFAULTS = [(name, 'Income') for name in DEFAULT_INCOME] + [(name, 'Expense') for name in DEFAULT_EXPENSE]
+
+# Per-user copies are remapped and deleted this many at a time
+BATCH_SIZE = 1000
+
+REBUILD_ROLLUPS = """
+    INSERT INTO daily_rollups (user_id, day, category_id, currency, total_income, total_expense, record_count)
+    SELECT u.id, r.date, COALESCE(r.category_id, 0), r.currency,
+           COALESCE(SUM(r.total_income), 0), COALESCE(SUM(r.total_expense), 0), COUNT(r.id)
+    FROM records r JOIN users u ON u.username = r.username
+    WHERE r.date IS NOT NULL
+    GROUP BY u.id, r.date, COALESCE(r.category_id, 0), r.currency
+"""
+
+
+def upgrade():
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.add_column(sa.Column('default_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('hidden', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.create_index('ix_category_default_id', ['default_id'], unique=False)
+        batch_op.create_foreign_key('fk_category_default_id', 'category', ['default_id'], ['id'])
+
+    connection = op.get_bind()
+    connection.execute(
+        sa.text("INSERT INTO category (user_id, name, type, amount, date, hidden) "
+                "VALUES (NULL, :name, :type, 0, :date, :hidden)"),
+        [{'name': name, 'type': category_type, 'date': date.today(), 'hidden': False}
+         for name, category_type in DEFAULTS]
+    )
+
+    # Point records and budgets at the shared row, then drop the per-user copies
+    remapped = 0
+    for name, category_type in DEFAULTS:
+        shared_id = connection.execute(
+            sa.text("SELECT MIN(id) FROM category WHERE user_id IS NULL AND name = :name AND type = :type"),
+            {'name': name, 'type': category_type}
+        ).scalar()
+        # Every user was given a copy of each default, so a user without one had
+        # deleted (or renamed) it: keep the shared default hidden for them
+        connection.execute(
+            sa.text("INSERT INTO category (user_id, name, type, amount, date, default_id, hidden) "
+                    "SELECT u.id, :name, :type, 0, :date, :shared_id, :hidden FROM users u "
+                    "WHERE NOT EXISTS (SELECT 1 FROM category c WHERE c.user_id = u.id "
+                    "AND c.name = :name AND c.type = :type)"),
+            {'name': name, 'type': category_type, 'date': date.today(), 'shared_id': shared_id, 'hidden': True}
+        )
+        while True:
+            copy_ids = connection.execute(
+                sa.text("SELECT id FROM category WHERE user_id IS NOT NULL AND name = :name AND type = :type "
+                        "AND default_id IS NULL ORDER BY id LIMIT :limit"),
+                {'name': name, 'type': category_type, 'limit': BATCH_SIZE}
+            ).scalars().all()
+            if not copy_ids:
+                break
+            params = {'shared_id': shared_id, 'copy_ids': copy_ids}
+            expanding = sa.bindparam('copy_ids', expanding=True)
+            connection.execute(
+                sa.text("UPDATE records SET category_id = :shared_id WHERE category_id IN :copy_ids")
+                .bindparams(expanding), params
+            )
+            connection.execute(
+                sa.text("UPDATE budget SET category_id = :shared_id WHERE category_id IN :copy_ids")
+                .bindparams(expanding), params
+            )
+            connection.execute(
+                sa.text("DELETE FROM category WHERE id IN :copy_ids").bindparams(expanding), params
+            )
+            remapped += len(copy_ids)
+
+    # Rollups are keyed by category; rebuild them rather than merge colliding rows
+    if remapped:
+        op.execute("DELETE FROM daily_rollups")
+        op.execute(REBUILD_ROLLUPS)
+
+
+def downgrade():
+    connection = op.get_bind()
+    shared = connection.execute(
+        sa.text("SELECT id, name, type, date FROM category WHERE user_id IS NULL")
+    ).all()
+
+    # Give every user their own copy of each shared category again
+    for shared_id, name, category_type, created in shared:
+        connection.execute(
+            sa.text("INSERT INTO category (user_id, name, type, amount, date, hidden) "
+                    "SELECT u.id, :name, :type, 0, :date, :hidden FROM users u "
+                    "WHERE NOT EXISTS (SELECT 1 FROM category c WHERE c.user_id = u.id AND c.default_id = :shared_id)"),
+            {'name': name, 'type': category_type, 'date': created, 'hidden': False, 'shared_id': shared_id}
+        )
+        connection.execute(
+            sa.text("UPDATE records SET category_id = ("
+                    "SELECT MIN(c.id) FROM category c JOIN users u ON u.id = c.user_id "
+                    "WHERE u.username = records.username AND c.name = :name AND c.type = :type "
+                    "AND c.default_id IS NULL) "
+                    "WHERE category_id = :shared_id"),
+            {'name': name, 'type': category_type, 'shared_id': shared_id}
+        )
+        connection.execute(
+            sa.text("UPDATE budget SET category_id = ("
+                    "SELECT MIN(c.id) FROM category c "
+                    "WHERE c.user_id = budget.user_id AND c.name = :name AND c.type = :type "
+                    "AND c.default_id IS NULL) "
+                    "WHERE category_id = :shared_id"),
+            {'name': name, 'type': category_type, 'shared_id': shared_id}
+        )
+
+    # Hidden rows only stand for deleted defaults; without the hidden column they would reappear
+    connection.execute(
+        sa.text("DELETE FROM category WHERE hidden = :hidden "
+                "AND id NOT IN (SELECT category_id FROM records WHERE category_id IS NOT NULL) "
+                "AND id NOT IN (SELECT category_id FROM budget WHERE category_id IS NOT NULL)"),
+        {'hidden': True}
+    )
+    op.execute("UPDATE category SET default_id = NULL")
+    op.execute("DELETE FROM category WHERE user_id IS NULL")
+    op.execute("DELETE FROM daily_rollups")
+    op.execute(REBUILD_ROLLUPS)
+
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_category_default_id', type_='foreignkey')
+        batch_op.drop_index('ix_category_default_id')
+        batch_op.drop_column('hidden')
+        batch_op.drop_column('default_id')
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,25 @@
+"""Add keyset pagination index to records
+
+Revision ID: a3c91e7d5b20
+Revises: 1feba35616ec
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91e7d5b20'
+down_revision = '1feba35616ec'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.create_index('ix_records_username_date_range_id', ['username', 'date_range', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.drop_index('ix_records_username_date_range_id')
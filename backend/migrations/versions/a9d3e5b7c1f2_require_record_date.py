@@ -0,0 +1,104 @@
+"""Give every record a date and make records.date NOT NULL
+
+Revision ID: a9d3e5b7c1f2
+Revises: f3a7c9e1d254
+Create Date: 2026-10-19 09:14:27.603158
+
+"""
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3e5b7c1f2'
+down_revision = 'f3a7c9e1d254'
+branch_labels = None
+depends_on = None
+
+# Affected users are rebuilt this many at a time
+BATCH_SIZE = 1000
+
+
+def current_periods(today):
+    """(period, first day, last day) of the monthly and weekly budget periods containing today."""
+    month_start = today.replace(day=1)
+    next_month = month_start.replace(year=month_start.year + 1, month=1) if month_start.month == 12 \
+        else month_start.replace(month=month_start.month + 1)
+    week_start = today - timedelta(days=today.weekday())
+    return [('monthly', month_start, next_month - timedelta(days=1)),
+            ('weekly', week_start, week_start + timedelta(days=6))]
+
+
+def rebuild_derived(connection, user_ids, today):
+    """
+    Rebuild the daily rollups of these users, and the budget spend of the
+    periods containing today (the only ones the backfilled records moved into).
+    """
+    params = {'user_ids': user_ids}
+    expanding = sa.bindparam('user_ids', expanding=True)
+    connection.execute(sa.text("DELETE FROM daily_rollups WHERE user_id IN :user_ids").bindparams(expanding), params)
+    connection.execute(sa.text("""
+        INSERT INTO daily_rollups (user_id, day, category_id, currency, total_income, total_expense, record_count)
+        SELECT u.id, r.date, COALESCE(r.category_id, 0), r.currency,
+               COALESCE(SUM(r.total_income), 0), COALESCE(SUM(r.total_expense), 0), COUNT(r.id)
+        FROM records r JOIN users u ON u.username = r.username
+        WHERE u.id IN :user_ids
+        GROUP BY u.id, r.date, COALESCE(r.category_id, 0), r.currency
+    """).bindparams(expanding), params)
+
+    for period, first, last in current_periods(today):
+        period_params = dict(params, period=period, first=first, last=last)
+        connection.execute(sa.text("""
+            DELETE FROM budget_spend WHERE period_start = :first AND budget_id IN (
+                SELECT id FROM budget WHERE period = :period AND user_id IN :user_ids)
+        """).bindparams(expanding), period_params)
+        connection.execute(sa.text("""
+            INSERT INTO budget_spend (budget_id, period_start, currency, total_income, total_expense, record_count)
+            SELECT b.id, :first, dr.currency, SUM(dr.total_income), SUM(dr.total_expense), SUM(dr.record_count)
+            FROM budget b JOIN daily_rollups dr ON dr.user_id = b.user_id AND dr.category_id = b.category_id
+            WHERE b.period = :period AND b.user_id IN :user_ids AND dr.day BETWEEN :first AND :last
+            GROUP BY b.id, dr.currency
+            HAVING SUM(dr.record_count) > 0
+        """).bindparams(expanding), period_params)
+
+    custom_params = dict(params, today=today)
+    connection.execute(sa.text("""
+        DELETE FROM budget_spend WHERE budget_id IN (
+            SELECT id FROM budget WHERE period = 'custom' AND user_id IN :user_ids
+            AND start_date <= :today AND end_date >= :today)
+    """).bindparams(expanding), custom_params)
+    connection.execute(sa.text("""
+        INSERT INTO budget_spend (budget_id, period_start, currency, total_income, total_expense, record_count)
+        SELECT b.id, b.start_date, dr.currency, SUM(dr.total_income), SUM(dr.total_expense), SUM(dr.record_count)
+        FROM budget b JOIN daily_rollups dr ON dr.user_id = b.user_id AND dr.category_id = b.category_id
+        WHERE b.period = 'custom' AND b.user_id IN :user_ids AND b.start_date <= :today AND b.end_date >= :today
+          AND dr.day BETWEEN b.start_date AND b.end_date
+        GROUP BY b.id, b.start_date, dr.currency
+        HAVING SUM(dr.record_count) > 0
+    """).bindparams(expanding), custom_params)
+
+
+def upgrade():
+    connection = op.get_bind()
+    today = date.today()
+
+    # Records whose date_range couldn't be parsed were left without a date;
+    # they get today's, like the backfill in c7e2f9a41d36 now does
+    user_ids = connection.execute(sa.text(
+        "SELECT DISTINCT u.id FROM users u JOIN records r ON r.username = u.username WHERE r.date IS NULL"
+    )).scalars().all()
+    if user_ids:
+        connection.execute(sa.text("UPDATE records SET date = :today WHERE date IS NULL"), {'today': today})
+        # Totals don't depend on the date; rollups and budget spend now include these records
+        for offset in range(0, len(user_ids), BATCH_SIZE):
+            rebuild_derived(connection, user_ids[offset:offset + BATCH_SIZE], today)
+
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.alter_column('date', existing_type=sa.Date(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.alter_column('date', existing_type=sa.Date(), nullable=True)
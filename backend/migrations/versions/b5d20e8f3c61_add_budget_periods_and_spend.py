@@ -0,0 +1,73 @@
+"""Add budget periods and the budget_spend table
+
+Revision ID: b5d20e8f3c61
+Revises: 8c1f5e27b4a3
+Create Date: 2026-10-18 18:12:40.937215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d20e8f3c61'
+down_revision = '8c1f5e27b4a3'
+branch_labels = None
+depends_on = None
+
+MONTH_START = {
+    'sqlite': "strftime('%Y-%m-01', dr.day)",
+    'mysql': "DATE_FORMAT(dr.day, '%Y-%m-01')",
+    'mariadb': "DATE_FORMAT(dr.day, '%Y-%m-01')",
+    'postgresql': "CAST(date_trunc('month', dr.day) AS DATE)",
+}
+
+
+def upgrade():
+    with op.batch_alter_table('budget', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('period', sa.String(length=10), nullable=False, server_default='monthly'))
+        batch_op.add_column(sa.Column('start_date', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('end_date', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), nullable=False, server_default='USD'))
+
+    # Existing budgets were in the owner's display currency
+    op.execute("""
+        UPDATE budget SET currency = (
+            SELECT MAX(setting.currency) FROM setting WHERE setting.user_id = budget.user_id
+        )
+        WHERE EXISTS (SELECT 1 FROM setting WHERE setting.user_id = budget.user_id)
+    """)
+
+    op.create_table('budget_spend',
+    sa.Column('budget_id', sa.Integer(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('total_income', sa.Float(), nullable=False),
+    sa.Column('total_expense', sa.Float(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['budget_id'], ['budget.id'], ),
+    sa.PrimaryKeyConstraint('budget_id', 'period_start', 'currency')
+    )
+
+    # Every existing budget is monthly; seed its spend from the daily rollups
+    month_start = MONTH_START.get(op.get_bind().dialect.name)
+    if month_start is None:
+        return  # run `flask rebuild-rollups` to fill budget_spend instead
+    op.execute(f"""
+        INSERT INTO budget_spend (budget_id, period_start, currency, total_income, total_expense, record_count)
+        SELECT b.id, {month_start}, dr.currency,
+               SUM(dr.total_income), SUM(dr.total_expense), SUM(dr.record_count)
+        FROM budget b JOIN daily_rollups dr ON dr.user_id = b.user_id AND dr.category_id = b.category_id
+        GROUP BY b.id, {month_start}, dr.currency
+        HAVING SUM(dr.record_count) > 0
+    """)
+
+
+def downgrade():
+    op.drop_table('budget_spend')
+
+    with op.batch_alter_table('budget', schema=None) as batch_op:
+        batch_op.drop_column('currency')
+        batch_op.drop_column('end_date')
+        batch_op.drop_column('start_date')
+        batch_op.drop_column('period')
@@ -0,0 +1,95 @@
+"""Add indexed transaction date to records and backfill it from date_range
+
+Revision ID: c7e2f9a41d36
+Revises: a3c91e7d5b20
+Create Date: 2026-10-18 10:41:05.530912
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2f9a41d36'
+down_revision = 'a3c91e7d5b20'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def parse_date_range(value):
+    # Kept in sync with Record.parse_date_range; migrations must not import app code
+    value = (value or '').strip()
+    try:
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    except ValueError:
+        pass
+    if value[4:6].upper() == '-Q':
+        year, quarter = int(value[:4]), int(value[6:])
+        if not 1 <= quarter <= 4:
+            raise ValueError(value)
+        return date(year, (quarter - 1) * 3 + 1, 1)
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+def backfill_dates(connection):
+    """
+    Fill records.date from records.date_range in id-ordered batches.
+
+    Only rows that still have no date are touched, so if the migration is
+    interrupted it can simply be run again and picks up where it stopped.
+    Values that can't be parsed get today's date, so every record has one.
+    """
+    records = sa.table(
+        'records',
+        sa.column('id', sa.Integer),
+        sa.column('date_range', sa.String),
+        sa.column('date', sa.Date),
+    )
+    last_id = 0
+    today = date.today()
+
+    while True:
+        rows = connection.execute(
+            sa.select(records.c.id, records.c.date_range)
+            .where(records.c.date.is_(None), records.c.id > last_id)
+            .order_by(records.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for record_id, date_range in rows:
+            try:
+                parsed = parse_date_range(date_range)
+            except ValueError:
+                parsed = today
+            updates.append({'record_id': record_id, 'parsed_date': parsed})
+
+        connection.execute(
+            records.update()
+            .where(records.c.id == sa.bindparam('record_id'))
+            .values(date=sa.bindparam('parsed_date')),
+            updates
+        )
+        last_id = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('date', sa.Date(), nullable=True))
+        batch_op.create_index('ix_records_username_date_id', ['username', 'date', 'id'], unique=False)
+        batch_op.drop_index('ix_records_username_date_range_id')
+
+    backfill_dates(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table('records', schema=None) as batch_op:
+        batch_op.create_index('ix_records_username_date_range_id', ['username', 'date_range', 'id'], unique=False)
+        batch_op.drop_index('ix_records_username_date_id')
+        batch_op.drop_column('date')
@@ -0,0 +1,41 @@
+"""Add budget_alerts table
+
+Revision ID: d8a4f61c2e97
+Revises: b5d20e8f3c61
+Create Date: 2026-10-18 18:55:03.114862
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a4f61c2e97'
+down_revision = 'b5d20e8f3c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('budget_alerts',
+    sa.Column('budget_id', sa.Integer(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('threshold', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('spent', sa.Float(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['budget_id'], ['budget.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('budget_id', 'period_start', 'threshold')
+    )
+    with op.batch_alter_table('budget_alerts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_budget_alerts_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('budget_alerts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_budget_alerts_user_id'))
+
+    op.drop_table('budget_alerts')
@@ -0,0 +1,62 @@
+"""Add user_totals and account_totals summary tables
+
+Revision ID: e4b18d07c2a9
+Revises: c7e2f9a41d36
+Create Date: 2026-10-18 11:58:23.702144
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b18d07c2a9'
+down_revision = 'c7e2f9a41d36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('account_totals',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_income', sa.Float(), nullable=False),
+    sa.Column('total_expense', sa.Float(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('account_id')
+    )
+    with op.batch_alter_table('account_totals', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_account_totals_user_id'), ['user_id'], unique=False)
+
+    op.create_table('user_totals',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_income', sa.Float(), nullable=False),
+    sa.Column('total_expense', sa.Float(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Seed both tables from the existing records in two set-based statements
+    op.execute("""
+        INSERT INTO account_totals (account_id, user_id, total_income, total_expense, record_count)
+        SELECT r.account_id, u.id, COALESCE(SUM(r.total_income), 0), COALESCE(SUM(r.total_expense), 0), COUNT(r.id)
+        FROM records r JOIN users u ON u.username = r.username
+        GROUP BY r.account_id, u.id
+    """)
+    op.execute("""
+        INSERT INTO user_totals (user_id, total_income, total_expense, record_count)
+        SELECT user_id, SUM(total_income), SUM(total_expense), SUM(record_count)
+        FROM account_totals
+        GROUP BY user_id
+    """)
+
+
+def downgrade():
+    op.drop_table('user_totals')
+    with op.batch_alter_table('account_totals', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_account_totals_user_id'))
+
+    op.drop_table('account_totals')
@@ -0,0 +1,43 @@
+"""Add daily_rollups table for overview charts
+
+Revision ID: f0a6c3d85e17
+Revises: e4b18d07c2a9
+Create Date: 2026-10-18 13:20:47.285511
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f0a6c3d85e17'
+down_revision = 'e4b18d07c2a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('total_income', sa.Float(), nullable=False),
+    sa.Column('total_expense', sa.Float(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'category_id')
+    )
+
+    # Seed from existing records; large installs can use `flask rebuild-rollups` instead
+    op.execute("""
+        INSERT INTO daily_rollups (user_id, day, category_id, total_income, total_expense, record_count)
+        SELECT u.id, r.date, COALESCE(r.category_id, 0),
+               COALESCE(SUM(r.total_income), 0), COALESCE(SUM(r.total_expense), 0), COUNT(r.id)
+        FROM records r JOIN users u ON u.username = r.username
+        WHERE r.date IS NOT NULL
+        GROUP BY u.id, r.date, COALESCE(r.category_id, 0)
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_rollups')
@@ -0,0 +1,31 @@
+"""Index accounts and settings by user
+
+Revision ID: f3a7c9e1d254
+Revises: d8a4f61c2e97
+Create Date: 2026-10-18 20:12:40.517309
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a7c9e1d254'
+down_revision = 'd8a4f61c2e97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('accounts', schema=None) as batch_op:
+        batch_op.create_index('ix_accounts_user_id_account_type', ['user_id', 'account_type'], unique=False)
+
+    with op.batch_alter_table('setting', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_setting_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('setting', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_setting_user_id'))
+
+    with op.batch_alter_table('accounts', schema=None) as batch_op:
+        batch_op.drop_index('ix_accounts_user_id_account_type')
@@ -0,0 +1,256 @@
+"""
+Latency benchmark for the record listing, summary and overview pages.
+
+    python scripts/bench_endpoints.py
+    python scripts/bench_endpoints.py --sizes 1000,100000,1000000 --requests 50
+    python scripts/bench_endpoints.py --save-baseline bench_baseline.json
+    python scripts/bench_endpoints.py --baseline bench_baseline.json
+    python scripts/bench_endpoints.py --database-url mysql+pymysql://user:pw@localhost/bench
+
+One user is created per dataset size with that many records spread over
+the last three years, loaded with multi-row inserts from a fixed random
+seed, so every run sees the same data. The dataset is kept in --data-dir
+(SQLite) or the given database and reused by later runs.
+
+Each route is requested through the Flask test client with a logged-in
+session. The result cache is cleared before every request unless
+--warm-cache is given, so the numbers are for the uncached path. Reported
+per route: p50/p95/p99 latency, SQL statements per request and the peak
+Python memory of one request (measured in a separate tracemalloc pass so
+it doesn't slow the timed requests).
+
+With --baseline the run is compared against a file written earlier with
+--save-baseline; the exit status is 1 when any p95 is more than
+--tolerance slower or any route runs more statements than before.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+TODAY = date.today()
+ROUTES = {
+    'view': '/record/view',
+    'view_filtered': '/record/view?type=expense&start_date={year_ago}',
+    'summary': '/record/summary',
+    'summary_range': '/record/summary?start_date={year_ago}&end_date={today}',
+    'overview': '/record/overview',
+    'overview_year': '/record/overview?start_date={year_ago}&end_date={today}',
+}
+INSERT_CHUNK = 5000
+HISTORY_DAYS = 3 * 365
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def size_label(size):
+    for factor, suffix in ((1000000, 'M'), (1000, 'k')):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{suffix}"
+    return str(size)
+
+
+def load_user(size, seed):
+    """Create (or reuse) the benchmark user for a dataset size and return its id."""
+    from app import db
+    from app.models import Account, Category, DailyRollup, Record, User, UserTotals
+    from app.provisioning import provision_user
+
+    username = f"bench-{size_label(size)}"
+    user = User.query.filter_by(username=username).first()
+    if user is not None:
+        if Record.query.filter_by(username=username).count() == size:
+            return user.id
+        raise SystemExit(f"{username} exists with a different record count; use a fresh --data-dir.")
+
+    Category.create_default_categories()
+    template = User()
+    template.set_password('benchmark')
+    user = provision_user(username, f"{username}@example.com", password_hash=template.password_hash)
+    accounts = [account.id for account in Account.query.filter_by(user_id=user.id)]
+    categories = Category.query.filter(Category.user_id.is_(None)).all()
+    income = [category.id for category in categories if category.type == 'Income']
+    expense = [category.id for category in categories if category.type == 'Expense']
+
+    rng = random.Random(seed + size)
+    started = time.perf_counter()
+    for offset in range(0, size, INSERT_CHUNK):
+        rows = []
+        for _ in range(min(INSERT_CHUNK, size - offset)):
+            day = TODAY - timedelta(days=rng.randrange(HISTORY_DAYS))
+            is_income = rng.random() < 0.2
+            amount = round(rng.lognormvariate(3, 1), 2)
+            rows.append({
+                'account_id': rng.choice(accounts),
+                'username': username,
+                'total_income': amount if is_income else 0.0,
+                'total_expense': 0.0 if is_income else amount,
+                'date_range': day.isoformat(),
+                'date': day,
+                'currency': 'USD',
+                'category_id': rng.choice(income if is_income else expense),
+                'description': None,
+            })
+        db.session.execute(Record.__table__.insert(), rows)
+        db.session.commit()
+        print(f"  {username}: {offset + len(rows)}/{size} records", end='\r', flush=True)
+
+    # Totals and rollups are normally maintained per write; build them once here
+    UserTotals.rebuild()
+    DailyRollup.rebuild([user.id])
+    db.session.commit()
+    print(f"  {username}: {size} records loaded in {time.perf_counter() - started:.1f}s")
+    return user.id
+
+
+def measure(app, user_id, path, requests, warm_cache):
+    """Time `requests` GETs of path; returns the stats for the route."""
+    from sqlalchemy import event
+
+    from app import db
+    from app.cache import result_cache
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    def get():
+        if not warm_cache:
+            result_cache.local.clear()
+        response = client.get(path)
+        if response.status_code != 200:
+            raise SystemExit(f"GET {path} returned {response.status_code}; expected 200")
+        return response
+
+    get()  # warm-up: templates, reference data, connections
+
+    tracemalloc.start()
+    get()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            get()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': round(statements / requests, 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against the baseline; returns the list of regressions."""
+    regressions = []
+    for size, routes in results.items():
+        for route, stats in routes.items():
+            before = baseline.get(size, {}).get(route)
+            if before is None:
+                continue
+            change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+            flags = []
+            if change > tolerance:
+                flags.append('p95 regression')
+            if stats['queries'] > before['queries']:
+                flags.append(f"queries {before['queries']} -> {stats['queries']}")
+            print(f"  {size:>5} {route:<15} p95 {before['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms "
+                  f"({change:+.0%}){'  ' + ', '.join(flags) if flags else ''}")
+            if flags:
+                regressions.append((size, route, flags))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,100000',
+                        help='Comma-separated records per user (default: 1000,100000).')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='Comma-separated subset of: ' + ', '.join(ROUTES))
+    parser.add_argument('--requests', type=int, default=30, help='Timed requests per route.')
+    parser.add_argument('--database-url')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'expense-tracker-bench'),
+                        help='Where the SQLite dataset is kept between runs.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--warm-cache', action='store_true', help='Let the result cache serve repeated requests.')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--baseline', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against the baseline.')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(args.data_dir, 'bench_endpoints.db')
+    # Keep the benchmark quiet and representative of production settings
+    os.environ.setdefault('SQL_DETECT_REPEATS', 'false')
+
+    from app import create_app, db
+
+    app = create_app()
+    app.config['DEBUG'] = False
+    sizes = [int(size) for size in args.sizes.split(',')]
+    routes = {name: ROUTES[name] for name in args.routes.split(',')}
+    replacements = {'today': TODAY.isoformat(), 'year_ago': (TODAY - timedelta(days=365)).isoformat()}
+
+    with app.app_context():
+        db.create_all()
+        users = {size: load_user(size, args.seed) for size in sizes}
+
+    results = {}
+    print(f"{'size':>5} {'route':<15} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9}")
+    for size in sizes:
+        label = size_label(size)
+        results[label] = {}
+        for name, path in routes.items():
+            stats = measure(app, users[size], path.format(**replacements), args.requests, args.warm_cache)
+            results[label][name] = stats
+            print(f"{label:>5} {name:<15} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} "
+                  f"{stats['queries']:>8} {stats['peak_kib']:>9}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} route(s) regressed.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
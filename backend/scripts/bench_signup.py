@@ -0,0 +1,68 @@
+"""
+Signup throughput benchmark for the provisioning service.
+
+    python scripts/bench_signup.py --users 500
+    python scripts/bench_signup.py --users 500 --database-url mysql+pymysql://user:pw@localhost/bench
+
+Defaults to a throwaway SQLite file. The password is hashed once up front, so
+the numbers measure the database work of a signup; pass --hash-each to include
+bcrypt as well.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--database-url')
+    parser.add_argument('--hash-each', action='store_true', help='Hash the password for every signup.')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_signup.db')
+
+    from sqlalchemy import event
+
+    from app import create_app, db
+    from app.models import User
+    from app.provisioning import provision_user
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+        statements = 0
+
+        def count_statement(*_):
+            nonlocal statements
+            statements += 1
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+
+        template = User()
+        template.set_password('benchmark')
+        prefix = f"bench{int(time.time())}"
+
+        started = time.perf_counter()
+        for i in range(args.users):
+            provision_user(
+                f"{prefix}-{i}", f"{prefix}-{i}@example.com",
+                password='benchmark' if args.hash_each else None,
+                password_hash=None if args.hash_each else template.password_hash
+            )
+        elapsed = time.perf_counter() - started
+
+        print(f"{args.users} signups in {elapsed:.2f}s: {args.users / elapsed:.1f} signups/sec, "
+              f"{elapsed / args.users * 1000:.2f} ms/signup, {statements / args.users:.1f} statements/signup")
+
+
+if __name__ == "__main__":
+    main()
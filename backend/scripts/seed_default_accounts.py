@@ -1,20 +1,26 @@
 import sys
 import os
+import time
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from app import create_app
+from app.provisioning import backfill_defaults
 
-from app import create_app, db
-from app.models import User, Account
 
-# Create the Flask app context
-app = create_app() 
+def report(users, settings, accounts, last_id):
+    print(f"Checked {users} users (up to id {last_id}): {accounts} accounts added.")
 
-with app.app_context(): 
-    def seed_default_accounts():
-        users = User.query.all()
-        for user in users:
-            Account.create_default_accounts(user.id)
-        print("Default accounts seeded for all users.")
 
-    if __name__ == "__main__":
+def seed_default_accounts(chunk_size=10000):
+    # Set-based and chunked; users who already have their accounts are skipped, so reruns are safe.
+    # Accounts are created in the user's currency, or USD for users without settings.
+    started = time.perf_counter()
+    users, _, accounts = backfill_defaults(chunk_size, report, settings=False)
+    print(f"Default accounts seeded for {users} users ({accounts} accounts added) "
+          f"in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
         seed_default_accounts()
@@ -1,36 +1,25 @@
 import sys
 import os
+import time
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from app import create_app
+from app.provisioning import backfill_defaults
 
-from app import db
-from app.models import User, Setting
-from app.utils import fetch_currencies
+
+def report(users, settings, accounts, last_id):
+    print(f"Checked {users} users (up to id {last_id}): {settings} settings added.")
 
 
 # Function to seed old users with the default currency
-def seed_user_currencies():
-    # Fetch the available currencies
-    available_currencies = fetch_currencies()
-    
-    # If available currencies are empty, use default 'USD'
-    if not available_currencies:
-        available_currencies = ['USD']
-    
-    # Iterate over all users and create a Setting if it doesn't exist
-    users = User.query.all()
-    
-    for user in users:
-        # Check if the user already has a setting
-        user_setting = Setting.query.filter_by(user_id=user.id).first()
-        
-        if not user_setting:
-            # Create a new Setting with a default currency (e.g., 'USD')
-            new_setting = Setting(user_id=user.id, currency='USD')
-            db.session.add(new_setting)
-    
-    # Commit changes to the database
-    db.session.commit()
+def seed_user_currencies(chunk_size=10000):
+    # One INSERT ... SELECT per chunk of users for those without a Setting (currency 'USD'). Safe to rerun.
+    started = time.perf_counter()
+    users, settings, _ = backfill_defaults(chunk_size, report, accounts=False)
+    print(f"Currencies seeded for {users} users ({settings} settings added) in {time.perf_counter() - started:.1f}s.")
+
 
-# Call this function to seed the data
-seed_user_currencies()
+if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        seed_user_currencies()
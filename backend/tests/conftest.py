@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Config reads the environment at import time, so point it at a scratch database first
+_scratch = tempfile.mkdtemp(prefix='expense-tracker-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_scratch, 'test.db')
+os.environ['CURRENCY_PROVIDER'] = 'static'
+os.environ['CURRENCY_SNAPSHOT_PATH'] = os.path.join(_scratch, 'currency_rates.json')
+os.environ['JOB_FILES_DIR'] = os.path.join(_scratch, 'jobs')
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db  # noqa: E402
+from app.cache import result_cache  # noqa: E402
+from app.models import Account, Category, User  # noqa: E402
+from app.reference_data import reference_cache  # noqa: E402
+from app.user_cache import user_cache  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture(autouse=True)
+def app_context(app):
+    """Every test runs in an app context against freshly created tables and empty caches."""
+    # Ids and data versions restart with the tables, so cached entries would collide
+    for cache in (result_cache.local, reference_cache, user_cache):
+        cache.clear()
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def user():
+    user = User(username='alice', email='alice@example.com')
+    user.password_hash = 'x'
+    db.session.add(user)
+    db.session.flush()
+    db.session.add_all([
+        Account(user_id=user.id, account_type='Cash', currency='USD'),
+        Account(user_id=user.id, account_type='Savings', currency='USD'),
+        Category(user_id=user.id, name='Food', type='Expense'),
+        Category(user_id=user.id, name='Salary', type='Income'),
+    ])
+    db.session.commit()
+    return user
@@ -0,0 +1,60 @@
+from datetime import date
+
+from app import cache, db
+from app.cache import LRUCache, ResultCache
+from app.models import Account, Record, User
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_entries=2, ttl=60)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1  # 'b' is now the least recently used
+
+    lru.set('c', 3)
+
+    assert lru.get('b') is None
+    assert (lru.get('a'), lru.get('c')) == (1, 3)
+    assert len(lru) == 2
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    lru = LRUCache(max_entries=10, ttl=30)
+    lru.set('short', 1, ttl=5)
+    lru.set('default', 2)
+
+    now[0] += 10
+    assert lru.get('short') is None
+    assert lru.get('default') == 2
+
+    now[0] += 25
+    assert lru.get('default') is None
+    assert len(lru) == 0
+
+
+def test_record_write_invalidates_through_data_version(user):
+    results = ResultCache(max_entries=10, ttl=60)
+    computed = []
+
+    def overview():
+        computed.append(1)
+        return {'records': Record.query.filter_by(username=user.username).count()}
+
+    def cached_overview():
+        return results.get_or_compute('overview', user.id, User.get_data_version(user.id), (), overview)
+
+    assert cached_overview() == {'records': 0}
+    assert cached_overview() == {'records': 0}
+    assert len(computed) == 1
+
+    account = Account.query.filter_by(user_id=user.id).first()
+    record = Record(username=user.username, account_id=account.id, total_income=5.0, total_expense=0.0,
+                    date_range='2026-01-01', date=date(2026, 1, 1), currency='USD')
+    db.session.add(record)
+    Record.apply_contribution(user.id, record.contribution())  # bumps users.data_version
+    db.session.commit()
+
+    assert cached_overview() == {'records': 1}
+    assert len(computed) == 2
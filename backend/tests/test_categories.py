@@ -0,0 +1,58 @@
+from datetime import date
+
+import pytest
+
+from app import db
+from app.models import Account, Budget, Category, DailyRollup, Record
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+
+def add_record(user, category):
+    account = Account.query.filter_by(user_id=user.id).first()
+    record = Record(username=user.username, account_id=account.id, category_id=category.id, total_income=0.0,
+                    total_expense=5.0, date_range='2026-01-01', date=date(2026, 1, 1), currency='USD')
+    db.session.add(record)
+    Record.apply_contribution(user.id, record.contribution())
+    db.session.commit()
+    return record
+
+
+def test_category_in_use_is_not_deleted(client, user):
+    food = Category.query.filter_by(name='Food').one()
+    add_record(user, food)
+
+    client.post(f'/category/delete/{food.id}')
+
+    assert db.session.get(Category, food.id) is not None
+    assert DailyRollup.query.filter_by(category_id=food.id).count() == 1
+
+
+def test_category_with_a_budget_is_not_deleted(client, user):
+    food = Category.query.filter_by(name='Food').one()
+    db.session.add(Budget(user_id=user.id, name='Food', amount=100.0, category_id=food.id))
+    db.session.commit()
+
+    client.post(f'/category/delete/{food.id}')
+
+    assert db.session.get(Category, food.id) is not None
+
+
+def test_unused_category_is_deleted_with_its_leftover_rollups(client, user):
+    food = Category.query.filter_by(name='Food').one()
+    record = add_record(user, food)
+    Record.apply_contribution(user.id, record.contribution(), sign=-1)
+    db.session.delete(record)
+    db.session.commit()
+
+    client.post(f'/category/delete/{food.id}')
+
+    assert db.session.get(Category, food.id) is None
+    assert DailyRollup.query.filter_by(category_id=food.id).count() == 0
@@ -0,0 +1,48 @@
+import csv
+import io
+
+import pytest
+
+from app.importer import RowError, import_records, parse_csv
+from app.models import Record
+
+
+@pytest.fixture
+def small_field_limit():
+    previous = csv.field_size_limit(20)
+    yield
+    csv.field_size_limit(previous)
+
+
+def test_extra_columns_are_reported_not_raised():
+    rows = list(parse_csv(io.StringIO('date,amount\n2024-01-01,5\n2024-01-02,6,extra\n2024-01-03,7\n')))
+
+    assert rows[0] == (2, {'date': '2024-01-01', 'amount': '5'})
+    assert rows[1][0] == 3 and isinstance(rows[1][1], RowError)
+    assert rows[2] == (4, {'date': '2024-01-03', 'amount': '7'})
+
+
+def test_malformed_lines_are_reported_not_raised(small_field_limit):
+    rows = list(parse_csv(io.StringIO('date,amount\n2024-01-01,5\n2024-01-02,' + '9' * 50 + '\n2024-01-03,7\n')))
+
+    assert [line for line, _ in rows] == [2, 3, 4]
+    assert isinstance(rows[1][1], RowError)
+    assert rows[2][1] == {'date': '2024-01-03', 'amount': '7'}
+
+
+def test_import_skips_bad_rows_and_keeps_going(user, small_field_limit):
+    statement = io.StringIO(
+        'date,amount,account,description\n'
+        '2024-01-01,-5,Cash,lunch\n'
+        '2024-01-02,6,Cash,refund,extra\n'
+        '2024-01-03,-' + '9' * 50 + ',Cash,huge\n'
+        '2024-01-04,oops,Cash,bad amount\n'
+        '2024-01-05,100,Cash,salary\n'
+    )
+
+    result = import_records(user, parse_csv(statement), chunk_size=1)
+
+    assert (result.imported, result.failed) == (2, 3)
+    assert [line for line, _ in result.errors] == [3, 4, 5]
+    assert sorted(record.description for record in Record.query.filter_by(username=user.username)) == \
+        ['lunch', 'salary']
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from app.jobs import JOB_HANDLERS, claim_next_job, enqueue, fail_abandoned_jobs, run_job
+from app.models import Job
+
+TIMEOUT = 300
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Register test job kinds: 'ok' returns its payload, 'fail' raises."""
+    def fail(job, report_progress):
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(JOB_HANDLERS, 'ok', lambda job, report_progress: job.payload)
+    monkeypatch.setitem(JOB_HANDLERS, 'fail', fail)
+
+
+def running_job(user, attempts, max_attempts=3, heartbeat_age=TIMEOUT + 60):
+    job = Job(user_id=user.id, kind='ok', status=Job.RUNNING, attempts=attempts, max_attempts=max_attempts,
+              started_at=utcnow(), heartbeat_at=utcnow() - timedelta(seconds=heartbeat_age))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_queued_job_is_claimed_once(user, handlers):
+    job = enqueue(user.id, 'ok')
+
+    claimed = claim_next_job(TIMEOUT)
+
+    assert claimed.id == job.id
+    assert claimed.status == Job.RUNNING
+    assert claimed.attempts == 1
+    assert claim_next_job(TIMEOUT) is None
+
+
+def test_job_waits_for_run_after(user, handlers):
+    job = enqueue(user.id, 'ok')
+    job.run_after = utcnow() + timedelta(minutes=5)
+    db.session.commit()
+
+    assert claim_next_job(TIMEOUT) is None
+
+
+def test_running_job_with_recent_heartbeat_is_not_reclaimed(user):
+    running_job(user, attempts=1, heartbeat_age=10)
+
+    assert claim_next_job(TIMEOUT) is None
+
+
+def test_abandoned_job_with_attempts_left_is_reclaimed(user):
+    job = running_job(user, attempts=1)
+
+    claimed = claim_next_job(TIMEOUT)
+
+    assert claimed.id == job.id
+    assert claimed.attempts == 2
+
+
+def test_abandoned_job_without_attempts_left_is_failed(user):
+    job = running_job(user, attempts=3, max_attempts=3)
+
+    assert claim_next_job(TIMEOUT) is None
+    assert fail_abandoned_jobs(TIMEOUT) == 1
+
+    db.session.refresh(job)
+    assert job.status == Job.FAILED
+    assert job.finished_at is not None
+
+
+def test_failed_job_is_retried_with_backoff_then_failed(user, handlers):
+    enqueue(user.id, 'fail', max_attempts=2)
+
+    job = claim_next_job(TIMEOUT)
+    run_job(job, TIMEOUT)
+    job = db.session.get(Job, job.id)
+    assert job.status == Job.QUEUED
+    assert job.run_after > utcnow()
+    assert job.error == 'boom'
+
+    job.run_after = utcnow()
+    db.session.commit()
+    job = claim_next_job(TIMEOUT)
+    run_job(job, TIMEOUT)
+    job = db.session.get(Job, job.id)
+    assert job.status == Job.FAILED
+    assert job.attempts == 2
+
+
+def test_successful_job_stores_its_result(user, handlers):
+    enqueue(user.id, 'ok', payload={'answer': 42})
+
+    job = claim_next_job(TIMEOUT)
+    run_job(job, TIMEOUT)
+
+    job = db.session.get(Job, job.id)
+    assert job.status == Job.SUCCEEDED
+    assert job.result == {'answer': 42}
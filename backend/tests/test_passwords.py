@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from app import passwords
+from app.passwords import HasherBusy, PasswordHasher
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=1, timeout=5.0)
+    yield hasher
+    hasher._executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def slow_bcrypt(monkeypatch):
+    """Make hashing block until the returned event is set."""
+    release = threading.Event()
+    real_hash = passwords.bcrypt.generate_password_hash
+
+    def generate_password_hash(password, rounds):
+        release.wait(5)
+        return real_hash(password, rounds)
+
+    monkeypatch.setattr(passwords.bcrypt, 'generate_password_hash', generate_password_hash)
+    yield release
+    release.set()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_hash_and_check(hasher):
+    password_hash = hasher.hash('secret')
+
+    assert hasher.check(password_hash, 'secret')
+    assert not hasher.check(password_hash, 'wrong')
+    assert not hasher.needs_rehash(password_hash)
+    assert PasswordHasher(rounds=5).needs_rehash(password_hash)
+    assert hasher.stats()['pending'] == 0
+
+
+def test_full_queue_is_rejected(hasher, slow_bcrypt):
+    # One running and one queued fill a pool of 1 worker with a queue of 1
+    threads = [threading.Thread(target=hasher.hash, args=('secret',)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: hasher.stats()['pending'] == 2)
+
+    with pytest.raises(HasherBusy):
+        hasher.hash('secret')
+    assert hasher.stats()['rejected'] == 1
+
+    slow_bcrypt.set()
+    for thread in threads:
+        thread.join()
+    assert hasher.stats()['pending'] == 0
+
+
+def test_timeout_raises_busy_and_counts_until_the_hash_finishes(hasher, slow_bcrypt):
+    hasher.timeout = 0.05
+
+    with pytest.raises(HasherBusy, match='Setting the password'):
+        hasher.hash('secret')
+    # The hash is still running on the pool, so it still counts against the limit
+    assert hasher.stats()['pending'] == 1
+
+    slow_bcrypt.set()
+    wait_for(lambda: hasher.stats()['pending'] == 0)
+
+
+def test_check_timeout_message(hasher, monkeypatch):
+    hasher.timeout = 0.05
+    release = threading.Event()
+    monkeypatch.setattr(passwords.bcrypt, 'check_password_hash', lambda password_hash, password: release.wait(5))
+
+    with pytest.raises(HasherBusy, match='Checking the password'):
+        hasher.check('hash', 'secret')
+    release.set()
@@ -0,0 +1,90 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Account, Record
+from app.utils import decode_cursor
+
+
+def add_records(user, days):
+    account = Account.query.filter_by(user_id=user.id).first()
+    records = [
+        Record(username=user.username, account_id=account.id, total_income=0.0, total_expense=1.0,
+               date_range=day.isoformat(), date=day, currency='USD')
+        for day in days
+    ]
+    db.session.add_all(records)
+    db.session.commit()
+    return records
+
+
+def all_pages(username, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        records, cursor = Record.get_page_by_user(username, cursor=cursor, limit=limit, **filters)
+        pages.append([record.id for record in records])
+        if cursor is None:
+            return pages
+
+
+def test_pages_are_newest_first_without_gaps_or_repeats(user):
+    days = [date(2026, 1, day) for day in (5, 1, 3, 2, 4, 3, 1)]
+    add_records(user, days)
+
+    pages = all_pages(user.username, limit=3)
+
+    expected = [record.id for record in Record.query.order_by(Record.date.desc(), Record.id.desc())]
+    assert [record_id for page in pages for record_id in page] == expected
+    assert [len(page) for page in pages] == [3, 3, 1]
+
+
+def test_equal_dates_are_paged_by_id(user):
+    records = add_records(user, [date(2026, 3, 1)] * 7)
+
+    pages = all_pages(user.username, limit=2)
+
+    assert [record_id for page in pages for record_id in page] == sorted((r.id for r in records), reverse=True)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+
+
+def test_last_full_page_has_no_cursor(user):
+    add_records(user, [date(2026, 3, 1)] * 4)
+
+    first, cursor = Record.get_page_by_user(user.username, limit=2)
+    second, cursor = Record.get_page_by_user(user.username, cursor=cursor, limit=2)
+
+    assert len(second) == 2
+    assert cursor is None
+
+
+def test_cursor_round_trips_date_and_id(user):
+    add_records(user, [date(2026, 2, 1), date(2026, 2, 2), date(2026, 2, 3)])
+
+    records, cursor = Record.get_page_by_user(user.username, limit=2)
+
+    assert decode_cursor(cursor) == [records[-1].date.isoformat(), str(records[-1].id)]
+
+
+def test_invalid_cursor_is_rejected(user):
+    with pytest.raises(ValueError):
+        Record.get_page_by_user(user.username, cursor='not a cursor!')
+
+
+def test_filters_apply_on_every_page(user):
+    add_records(user, [date(2026, 1, day) for day in range(1, 11)])
+
+    pages = all_pages(user.username, limit=2, start_date=date(2026, 1, 3), end_date=date(2026, 1, 8))
+
+    dates = [db.session.get(Record, record_id).date for page in pages for record_id in page]
+    assert dates == [date(2026, 1, day) for day in range(8, 2, -1)]
+
+
+def test_record_date_is_required(user):
+    account = Account.query.filter_by(user_id=user.id).first()
+    db.session.add(Record(username=user.username, account_id=account.id, total_income=1.0, total_expense=0.0,
+                          date_range='unknown', date=None, currency='USD'))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
@@ -0,0 +1,26 @@
+from app import db
+from app.models import Account, Category, User
+from app.reference_data import get_reference_data
+
+
+def test_account_write_from_another_worker_is_seen(user):
+    assert len(get_reference_data(user.id).accounts) == 2
+
+    # What another process does: write and bump the version, without touching this process' cache
+    db.session.delete(Account.query.filter_by(user_id=user.id).first())
+    User.bump_data_version(user.id)
+    db.session.commit()
+
+    assert len(get_reference_data(user.id).accounts) == 1
+
+
+def test_new_shared_defaults_reach_every_user(user):
+    other = User(username='bob', email='bob@example.com', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+    assert get_reference_data(other.id).categories == []
+
+    Category.create_default_categories()
+
+    assert get_reference_data(other.id).expense_categories
+    assert {c.name for c in get_reference_data(user.id).income_categories} >= {'Salary', 'Awards'}
@@ -0,0 +1,51 @@
+from datetime import date
+
+from app import db
+from app.models import Account, Category, DailyRollup, Record
+
+
+def rollup_rows(user):
+    return sorted(
+        (row.day, row.category_id, row.currency, round(row.total_income, 2), round(row.total_expense, 2),
+         row.record_count)
+        for row in DailyRollup.query.filter(DailyRollup.user_id == user.id, DailyRollup.record_count != 0)
+    )
+
+
+def test_incremental_rollups_match_a_rebuild(user):
+    cash = Account.query.filter_by(user_id=user.id).first()
+    food = Category.query.filter_by(name='Food').one()
+    salary = Category.query.filter_by(name='Salary').one()
+
+    records = [
+        Record(username=user.username, account_id=cash.id, category_id=category.id, total_income=income,
+               total_expense=expense, date_range=day.isoformat(), date=day, currency='USD')
+        for category, income, expense, day in (
+            (salary, 1000.0, 0.0, date(2026, 1, 31)),
+            (food, 0.0, 12.5, date(2026, 2, 1)),
+            (food, 0.0, 7.5, date(2026, 2, 1)),
+        )
+    ]
+    for record in records:
+        db.session.add(record)
+        Record.apply_contribution(user.id, record.contribution())
+    db.session.commit()
+
+    # Move one expense to another day, delete another
+    moved, deleted = records[1], records[2]
+    old = moved.contribution()
+    moved.date_range, moved.date = '2026-02-03', date(2026, 2, 3)
+    Record.apply_contribution(user.id, old, sign=-1)
+    Record.apply_contribution(user.id, moved.contribution())
+    Record.apply_contribution(user.id, deleted.contribution(), sign=-1)
+    db.session.delete(deleted)
+    db.session.commit()
+
+    incremental = rollup_rows(user)
+    assert incremental == [
+        (date(2026, 1, 31), salary.id, 'USD', 1000.0, 0.0, 1),
+        (date(2026, 2, 3), food.id, 'USD', 0.0, 12.5, 1),
+    ]
+    DailyRollup.rebuild([user.id])
+    db.session.commit()
+    assert rollup_rows(user) == incremental
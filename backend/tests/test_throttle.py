@@ -0,0 +1,126 @@
+import types
+
+import pytest
+
+from app import throttle
+from app.throttle import LocalBuckets, LoginThrottle, RedisBuckets, init_throttle, login_throttle
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttle.time, 'monotonic', clock.monotonic)
+    return clock
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """A stand-in for the redis package whose scripts always fail, as if the server were down."""
+    class RedisError(Exception):
+        pass
+
+    class Client:
+        def register_script(self, script):
+            def run(keys, args):
+                raise RedisError('connection refused')
+            return run
+
+    class Redis:
+        @staticmethod
+        def from_url(url, **kwargs):
+            return Client()
+
+    module = types.SimpleNamespace(Redis=Redis, RedisError=RedisError)
+    monkeypatch.setattr(throttle, 'redis', module)
+    return module
+
+
+@pytest.fixture
+def reset_throttle(app):
+    yield
+    init_throttle(app)
+
+
+def test_bucket_refills_over_time(clock):
+    buckets = LocalBuckets()
+
+    assert buckets.take('k', 2, 0.5) == (True, 0.0)
+    assert buckets.take('k', 2, 0.5) == (True, 0.0)
+    assert buckets.take('k', 2, 0.5) == (False, 2.0)
+
+    clock.now += 1
+    assert buckets.take('k', 2, 0.5) == (False, 1.0)
+    clock.now += 2
+    assert buckets.take('k', 2, 0.5) == (True, 0.0)
+    # Refilling stops at the capacity
+    clock.now += 60
+    assert buckets.take('k', 2, 0.5)[0]
+    assert buckets.take('k', 2, 0.5)[0]
+    assert not buckets.take('k', 2, 0.5)[0]
+
+
+def test_username_and_address_are_limited_separately(clock):
+    limits = LoginThrottle(username_burst=1, username_per_minute=6, address_burst=3, address_per_minute=60)
+
+    assert limits.check('Alice', '10.0.0.1') == 0
+    assert limits.check(' alice ', '10.0.0.2') == 10
+    assert limits.check('bob', '10.0.0.1') == 0
+    assert limits.check('carol', '10.0.0.1') == 0
+    assert limits.check('dave', '10.0.0.1') == 1
+    assert limits.stats() == {'allowed': 3, 'rejected_username': 1, 'rejected_address': 1}
+
+
+def test_login_is_rejected_with_retry_after(app, reset_throttle):
+    login_throttle.configure(username_burst=1, username_per_minute=1)
+    client = app.test_client()
+    form = {'username': 'mallory', 'password': 'guess'}
+
+    assert client.post('/auth/login', data=form).status_code != 429
+    response = client.post('/auth/login', data=form)
+
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 60
+
+
+def test_backend_is_local_without_redis_url(app, monkeypatch, reset_throttle):
+    monkeypatch.setitem(app.config, 'THROTTLE_REDIS_URL', None)
+    monkeypatch.setitem(app.config, 'CACHE_REDIS_URL', None)
+
+    init_throttle(app)
+
+    assert isinstance(login_throttle.backend, LocalBuckets)
+
+
+@pytest.mark.parametrize('setting', ['THROTTLE_REDIS_URL', 'CACHE_REDIS_URL'])
+def test_backend_is_redis_when_url_is_set(app, monkeypatch, fake_redis, reset_throttle, setting):
+    monkeypatch.setitem(app.config, 'THROTTLE_REDIS_URL', None)
+    monkeypatch.setitem(app.config, 'CACHE_REDIS_URL', None)
+    monkeypatch.setitem(app.config, setting, 'redis://localhost:6379/0')
+
+    init_throttle(app)
+
+    assert isinstance(login_throttle.backend, RedisBuckets)
+
+
+def test_backend_is_local_when_redis_is_not_installed(app, monkeypatch, reset_throttle):
+    monkeypatch.setattr(throttle, 'redis', None)
+    monkeypatch.setitem(app.config, 'THROTTLE_REDIS_URL', 'redis://localhost:6379/0')
+
+    init_throttle(app)
+
+    assert isinstance(login_throttle.backend, LocalBuckets)
+
+
+def test_redis_errors_fall_back_to_local_buckets(fake_redis):
+    buckets = RedisBuckets('redis://localhost:6379/0')
+
+    assert buckets.take('k', 1, 1.0) == (True, 0.0)
+    assert buckets.take('k', 1, 1.0)[0] is False
@@ -0,0 +1,115 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Account, AccountTotals, Category, FxRate, Record, UserTotals, _increment_totals
+
+
+def test_increment_totals_inserts_then_adds(user):
+    _increment_totals(UserTotals, {'user_id': user.id}, 10.0, 0.0, 1)
+    _increment_totals(UserTotals, {'user_id': user.id}, 0.0, 4.0, 1)
+    _increment_totals(UserTotals, {'user_id': user.id}, -10.0, 0.0, -1)
+    db.session.commit()
+
+    totals = db.session.get(UserTotals, user.id)
+    assert (totals.total_income, totals.total_expense, totals.record_count) == (0.0, 4.0, 1)
+
+
+def write(user, record, old_contribution=None):
+    """Save a record the way the record routes do."""
+    if old_contribution is not None:
+        Record.apply_contribution(user.id, old_contribution, sign=-1)
+    else:
+        db.session.add(record)
+    Record.apply_contribution(user.id, record.contribution())
+    db.session.commit()
+
+
+def delete(user, record):
+    Record.apply_contribution(user.id, record.contribution(), sign=-1)
+    db.session.delete(record)
+    db.session.commit()
+
+
+def test_record_writes_keep_totals_consistent(user):
+    cash, savings = Account.query.filter_by(user_id=user.id).order_by(Account.id).all()
+    food = Category.query.filter_by(name='Food').one()
+    salary = Category.query.filter_by(name='Salary').one()
+
+    pay = Record(username=user.username, account_id=savings.id, category_id=salary.id, total_income=1000.0,
+                 total_expense=0.0, date_range='2026-01-31', date=date(2026, 1, 31), currency='USD')
+    lunch = Record(username=user.username, account_id=cash.id, category_id=food.id, total_income=0.0,
+                   total_expense=12.5, date_range='2026-02-01', date=date(2026, 2, 1), currency='USD')
+    write(user, pay)
+    write(user, lunch)
+
+    # Move the expense to another account, day and amount
+    old = lunch.contribution()
+    lunch.account_id, lunch.total_expense = savings.id, 20.0
+    lunch.date_range, lunch.date = '2026-02-03', date(2026, 2, 3)
+    write(user, lunch, old)
+
+    extra = Record(username=user.username, account_id=cash.id, category_id=food.id, total_income=0.0,
+                   total_expense=3.0, date_range='2026-02-03', date=date(2026, 2, 3), currency='USD')
+    write(user, extra)
+    delete(user, extra)
+
+    assert UserTotals.verify() == []
+    totals = db.session.get(UserTotals, user.id)
+    assert (totals.total_income, totals.total_expense, totals.record_count) == (1000.0, 20.0, 2)
+    assert db.session.get(AccountTotals, cash.id).record_count == 0
+
+
+def test_verify_reports_drift(user):
+    cash = Account.query.filter_by(user_id=user.id).first()
+    write(user, Record(username=user.username, account_id=cash.id, total_income=0.0, total_expense=5.0,
+                       date_range='2026-01-01', date=date(2026, 1, 1), currency='USD'))
+
+    db.session.get(AccountTotals, cash.id).total_expense = 50.0
+    db.session.commit()
+
+    # The account row is wrong, and the user's totals no longer match the sum of their accounts
+    assert [(kind, key) for kind, key, _, _ in UserTotals.verify()] == [('account', cash.id), ('user', user.id)]
+    UserTotals.rebuild()
+    db.session.commit()
+    assert UserTotals.verify() == []
+
+
+def count_statements(func):
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        return func(), statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def test_single_currency_summary_is_one_lookup(user):
+    cash = Account.query.filter_by(user_id=user.id).first()
+    write(user, Record(username=user.username, account_id=cash.id, total_income=30.0, total_expense=10.0,
+                       date_range='2026-01-01', date=date(2026, 1, 1), currency='USD'))
+
+    user_id = user.id
+    summary, statements = count_statements(lambda: UserTotals.get_summary(user_id, 'USD'))
+
+    assert summary == {'total_income': 30.0, 'total_expense': 10.0, 'net_balance': 20.0, 'currency': 'USD'}
+    assert len(statements) == 1
+
+
+def test_summary_converts_other_currencies(user):
+    cash = Account.query.filter_by(user_id=user.id).first()
+    euro = Account(user_id=user.id, account_type='Euro', currency='EUR')
+    db.session.add(euro)
+    db.session.commit()
+    FxRate.store({'USD': 1.0, 'EUR': 0.5})
+    write(user, Record(username=user.username, account_id=cash.id, total_income=30.0, total_expense=0.0,
+                       date_range='2026-01-01', date=date(2026, 1, 1), currency='USD'))
+    write(user, Record(username=user.username, account_id=euro.id, total_income=0.0, total_expense=10.0,
+                       date_range='2026-01-01', date=date(2026, 1, 1), currency='EUR'))
+
+    assert UserTotals.get_summary(user.id, 'USD') == \
+        {'total_income': 30.0, 'total_expense': 20.0, 'net_balance': 10.0, 'currency': 'USD'}
+    assert UserTotals.get_summary(user.id) == \
+        {'total_income': 30.0, 'total_expense': 10.0, 'net_balance': 20.0, 'currency': None}